@@ -67,32 +67,8 @@ async function handleSendQuestion() {
     showLoading(true);
 
     try {
-        // Send question to API
-        const response = await fetch('/api/ask', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ question: question })
-        });
-
-        if (!response.ok) {
-            const errorData = await response.json();
-
-            if (response.status === 429) {
-                // Rate limit exceeded
-                const detail = errorData.detail;
-                const message = detail.message || 'Rate limit exceeded. Please try again later.';
-                throw new Error(message);
-            } else {
-                throw new Error(errorData.detail || 'Failed to get answer');
-            }
-        }
-
-        const data = await response.json();
-
-        // Add assistant message to chat
-        addAssistantMessage(data.answer, data.sources);
+        // Stream the answer so the first tokens appear as soon as they are generated
+        const data = await streamAnswer(question);
 
         // Store in conversation history
         conversationHistory.push({
@@ -136,6 +112,131 @@ async function handleSendQuestion() {
     }
 }
 
+async function streamAnswer(question) {
+    const response = await fetch('/api/ask/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ question: question })
+    });
+
+    if (!response.ok) {
+        const errorData = await response.json();
+
+        if (response.status === 429) {
+            // Rate limit exceeded
+            const detail = errorData.detail;
+            const message = detail.message || 'Rate limit exceeded. Please try again later.';
+            throw new Error(message);
+        } else {
+            throw new Error(errorData.detail || 'Failed to get answer');
+        }
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let answer = '';
+    let sources = [];
+    let message = null;
+    let finished = false;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+
+        buffer += decoder.decode(value, { stream: true });
+
+        // Server-sent events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const event = parseServerSentEvent(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+
+            if (event.type === 'sources') {
+                sources = event.data.sources;
+            } else if (event.type === 'token') {
+                if (!message) {
+                    // First token: replace the spinner with the answer being written
+                    showLoading(false);
+                    message = addStreamingAssistantMessage();
+                }
+                answer += event.data.content;
+                message.update(answer);
+            } else if (event.type === 'done') {
+                finished = true;
+            } else if (event.type === 'error') {
+                if (message) {
+                    message.remove();
+                }
+                throw new Error(event.data.message || 'Failed to get answer');
+            }
+        }
+    }
+
+    if (!finished) {
+        // The connection closed before the server said the answer was complete
+        if (message) {
+            message.remove();
+        }
+        throw new Error('The answer was interrupted. Please try again.');
+    }
+
+    if (!message) {
+        message = addStreamingAssistantMessage();
+    }
+    message.finish(answer, sources);
+
+    return { answer: answer, sources: sources };
+}
+
+function parseServerSentEvent(raw) {
+    let type = 'message';
+    const dataLines = [];
+
+    raw.split('\n').forEach(line => {
+        if (line.startsWith('event:')) {
+            type = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            dataLines.push(line.slice(5).trim());
+        }
+    });
+
+    return { type: type, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : {} };
+}
+
+function addStreamingAssistantMessage() {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message assistant';
+
+    const contentDiv = document.createElement('div');
+    contentDiv.className = 'message-content';
+
+    const textDiv = document.createElement('div');
+    textDiv.className = 'message-text';
+
+    contentDiv.appendChild(textDiv);
+    messageDiv.appendChild(contentDiv);
+    chatContainer.appendChild(messageDiv);
+
+    return {
+        update(text) {
+            // Plain text while streaming; links are rendered once the answer is complete
+            textDiv.textContent = text;
+        },
+        finish(text, sources) {
+            messageDiv.remove();
+            addAssistantMessage(text, sources);
+        },
+        remove() {
+            messageDiv.remove();
+        }
+    };
+}
+
 function addUserMessage(text) {
     // Transition from initial state to chat state
     const container = document.querySelector('.container');
@@ -12,13 +12,20 @@ from collections import defaultdict, deque
 from typing import Dict, List, Optional
 from pathlib import Path
 from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import hmac
 import json
+import signal
+import subprocess
+import threading
+import time
 import uuid
 import bcrypt
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Header, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
@@ -27,6 +34,7 @@ from pythonjsonlogger import jsonlogger
 try:
     import redis
     from redis import Redis
+    from redis.asyncio import Redis as AsyncRedis
     REDIS_AVAILABLE = True
 except ImportError:
     REDIS_AVAILABLE = False
@@ -43,7 +51,10 @@ ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 # Global instances (will be initialized in lifespan)
 qa_tool = None
 redis_client: Optional[Redis] = None
+async_redis_client = None  # redis.asyncio client used for cross-worker request coalescing
 rate_limit_storage: Dict[str, deque] = None
+reload_lock: Optional[asyncio.Lock] = None  # One index rebuild at a time per worker
+reload_tasks = set()
 
 # Setup structured JSON logging
 def setup_logging():
@@ -77,9 +88,33 @@ def setup_logging():
 
 logger = setup_logging()
 
+# Workers open the prebuilt index read-only instead of scanning CONTEXT_DIR on startup
+INDEX_READ_ONLY = os.getenv("INDEX_READ_ONLY", "false").lower() == "true"
+
+# Unix socket of the shared retrieval service; when set, workers embed and rank
+# queries there and map only the chunk text (unset: each worker retrieves itself)
+RETRIEVAL_SOCKET = os.getenv("RETRIEVAL_SOCKET", "")
+
+# Hot reload: poll CONTEXT_DIR and the published index version (0 disables polling)
+CONTEXT_WATCH_INTERVAL_SECONDS = int(os.getenv("CONTEXT_WATCH_INTERVAL_SECONDS", "30"))
+# Token for the admin endpoints (/api/admin/reload, /api/ask/batch); they are disabled when unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Batch question API limits
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "200"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# Request coalescing configuration
+ENABLE_REQUEST_COALESCING = os.getenv("ENABLE_REQUEST_COALESCING", "true").lower() == "true"
+COALESCE_WAIT_SECONDS = int(os.getenv("COALESCE_WAIT_SECONDS", "60"))
+
 # Rate limiting configuration
 RATE_LIMIT_MAX_REQUESTS = int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "10"))
 RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_MINUTES", "60")) * 60
+# /api/search makes no chat completion, so it has its own, larger allowance per window
+SEARCH_RATE_LIMIT_MAX_REQUESTS = int(os.getenv("SEARCH_RATE_LIMIT_MAX_REQUESTS", "300"))
+# How long browsers and proxies may reuse a search response before revalidating its ETag
+SEARCH_CACHE_MAX_AGE_SECONDS = int(os.getenv("SEARCH_CACHE_MAX_AGE_SECONDS", "300"))
 
 
 @asynccontextmanager
@@ -88,13 +123,13 @@ async def lifespan(app: FastAPI):
     Lifespan context manager for startup and shutdown events
     Replaces deprecated @app.on_event decorators
     """
-    global qa_tool, redis_client, rate_limit_storage
+    global qa_tool, redis_client, async_redis_client, rate_limit_storage, reload_lock
 
     # Startup
     logger.info(f"Starting Zenon AI in {ENVIRONMENT} mode...")
 
     # Initialize rate limit storage
-    rate_limit_storage = defaultdict(lambda: deque(maxlen=RATE_LIMIT_MAX_REQUESTS))
+    rate_limit_storage = defaultdict(deque)
 
     # Initialize Redis if available and configured
     if REDIS_AVAILABLE and REDIS_URL:
@@ -108,6 +143,9 @@ async def lifespan(app: FastAPI):
             # Test connection
             redis_client.ping()
             logger.info(f"Redis connected: {REDIS_URL}")
+
+            # Async client for pub/sub waits that must not block the event loop
+            async_redis_client = AsyncRedis.from_url(REDIS_URL, decode_responses=True, socket_connect_timeout=5)
         except Exception as e:
             logger.warning(f"Redis connection failed: {e}, using in-memory rate limiting")
             redis_client = None
@@ -123,13 +161,17 @@ async def lifespan(app: FastAPI):
 
     # Determine context directory
     context_dir = os.getenv('CONTEXT_DIR', 'context')
-    if not os.path.exists(context_dir):
+    if not INDEX_READ_ONLY and not os.path.exists(context_dir):
         logger.error(f"Context directory not found: {context_dir}")
         logger.error("Please ensure the context/ directory exists with Markdown documentation")
         sys.exit(1)
 
     try:
-        qa_tool = ZenonQA(context_dir, api_key)
+        qa_tool = ZenonQA(context_dir, api_key, read_only=INDEX_READ_ONLY,
+                          retrieval_socket=RETRIEVAL_SOCKET or None)
+        # Share query embeddings and chunk summaries across workers through the same Redis connection
+        qa_tool.query_cache.redis = redis_client
+        qa_tool.summary_cache.redis = redis_client
         logger.info(f"Zenon AI initialized with {len(qa_tool.documents)} documents from {context_dir}/")
         logger.info(f"Rate limiting: {RATE_LIMIT_MAX_REQUESTS} requests per {RATE_LIMIT_WINDOW_SECONDS // 60} minutes per IP")
         logger.info(f"CORS allowed origins: {ALLOWED_ORIGINS}")
@@ -137,11 +179,17 @@ async def lifespan(app: FastAPI):
         logger.error(f"ERROR initializing Zenon AI: {e}", exc_info=True)
         sys.exit(1)
 
+    reload_lock = asyncio.Lock()
+    watch_task = asyncio.create_task(watch_index()) if CONTEXT_WATCH_INTERVAL_SECONDS > 0 else None
+
     yield  # Application runs here
 
     # Shutdown
     logger.info("Shutting down Zenon AI...")
 
+    if watch_task:
+        watch_task.cancel()
+
     if redis_client:
         try:
             redis_client.close()
@@ -149,6 +197,12 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             logger.warning(f"Error closing Redis connection: {e}")
 
+    if async_redis_client:
+        try:
+            await async_redis_client.aclose()
+        except Exception as e:
+            logger.warning(f"Error closing async Redis connection: {e}")
+
 
 # Initialize FastAPI app with lifespan
 app = FastAPI(title="Zenon AI Web Interface", lifespan=lifespan)
@@ -165,11 +219,45 @@ app.add_middleware(
 
 class QuestionRequest(BaseModel):
     question: str
+    doc_types: Optional[List[str]] = None  # Only answer from documents of these types
+    filenames: Optional[List[str]] = None  # Only answer from these documents
 
 
 class AnswerResponse(BaseModel):
     answer: str
     sources: List[Dict]
+    cache_hit: bool = False
+
+
+class SearchResult(BaseModel):
+    filename: Optional[str]
+    title: Optional[str]
+    doc_type: Optional[str]
+    chunk_id: int
+    score: float
+    snippet: str
+
+
+class SearchResponse(BaseModel):
+    query: str
+    corpus_version: str
+    results: List[SearchResult]
+
+
+class BatchQuestionRequest(BaseModel):
+    questions: List[str]
+    context_docs: Optional[int] = None
+
+
+class BatchAnswer(AnswerResponse):
+    """One answer of a batch, in the order the questions were given"""
+    question: str
+    latency_ms: float
+
+
+class BatchAnswerResponse(BaseModel):
+    results: List[BatchAnswer]
+    stats: Dict
 
 
 class MessageData(BaseModel):
@@ -220,7 +308,7 @@ def get_client_ip(request: Request) -> str:
     return request.client.host
 
 
-def check_rate_limit_redis(ip_address: str) -> bool:
+def check_rate_limit_redis(ip_address: str, scope: str = "ask", max_requests: int = RATE_LIMIT_MAX_REQUESTS) -> bool:
     """
     Redis-backed rate limiting using sliding window
 
@@ -228,7 +316,7 @@ def check_rate_limit_redis(ip_address: str) -> bool:
         True if request is allowed, False if rate limit exceeded
     """
     try:
-        key = f"rate_limit:{ip_address}"
+        key = f"rate_limit:{ip_address}" if scope == "ask" else f"rate_limit:{scope}:{ip_address}"
         now = datetime.now().timestamp()
         window_start = now - RATE_LIMIT_WINDOW_SECONDS
 
@@ -238,7 +326,7 @@ def check_rate_limit_redis(ip_address: str) -> bool:
         # Count requests in current window
         request_count = redis_client.zcard(key)
 
-        if request_count >= RATE_LIMIT_MAX_REQUESTS:
+        if request_count >= max_requests:
             logger.warning(f"Rate limit exceeded for IP: {ip_address}")
             return False
 
@@ -256,7 +344,7 @@ def check_rate_limit_redis(ip_address: str) -> bool:
         return True
 
 
-def check_rate_limit_memory(ip_address: str) -> bool:
+def check_rate_limit_memory(ip_address: str, scope: str = "ask", max_requests: int = RATE_LIMIT_MAX_REQUESTS) -> bool:
     """
     In-memory rate limiting (fallback when Redis unavailable)
 
@@ -267,14 +355,14 @@ def check_rate_limit_memory(ip_address: str) -> bool:
     cutoff_time = now - timedelta(seconds=RATE_LIMIT_WINDOW_SECONDS)
 
     # Get request timestamps for this IP
-    timestamps = rate_limit_storage[ip_address]
+    timestamps = rate_limit_storage[f"{scope}:{ip_address}"]
 
     # Remove old timestamps outside the window
     while timestamps and timestamps[0] < cutoff_time:
         timestamps.popleft()
 
     # Check if limit exceeded
-    if len(timestamps) >= RATE_LIMIT_MAX_REQUESTS:
+    if len(timestamps) >= max_requests:
         logger.warning(f"Rate limit exceeded for IP: {ip_address}")
         return False
 
@@ -284,17 +372,21 @@ def check_rate_limit_memory(ip_address: str) -> bool:
     return True
 
 
-def check_rate_limit(ip_address: str) -> bool:
+def check_rate_limit(ip_address: str, scope: str = "ask", max_requests: int = RATE_LIMIT_MAX_REQUESTS) -> bool:
     """
     Check rate limit using Redis if available, otherwise fall back to in-memory
 
+    Args:
+        scope: Separate allowance per endpoint family ("ask" for the question endpoints)
+        max_requests: Requests allowed per RATE_LIMIT_WINDOW_SECONDS in this scope
+
     Returns:
         True if request is allowed, False if rate limit exceeded
     """
     if redis_client:
-        return check_rate_limit_redis(ip_address)
+        return check_rate_limit_redis(ip_address, scope, max_requests)
     else:
-        return check_rate_limit_memory(ip_address)
+        return check_rate_limit_memory(ip_address, scope, max_requests)
 
 
 # Session management functions
@@ -444,12 +536,15 @@ async def root():
     return HTMLResponse(content=html_content)
 
 
-@app.post("/api/ask", response_model=AnswerResponse)
-async def ask_question(request: Request, question_req: QuestionRequest):
+def validate_question_request(request: Request, question_req: QuestionRequest) -> tuple:
     """
-    Answer a question about Zenon Network design documentation
+    Apply the per-IP rate limit and basic validation shared by the question endpoints
 
-    Rate limited per IP address (configurable via environment)
+    Returns:
+        (client_ip, question) with the question stripped of surrounding whitespace
+
+    Raises:
+        HTTPException: 429 if rate limited, 400 if the question is empty or too long
     """
     # Get client IP
     client_ip = get_client_ip(request)
@@ -478,17 +573,210 @@ async def ask_question(request: Request, question_req: QuestionRequest):
         logger.warning(f"Question too long from IP: {client_ip}")
         raise HTTPException(status_code=400, detail="Question is too long (max 1000 characters)")
 
+    validate_doc_filters(question_req.doc_types, question_req.filenames)
+
+    logger.info(f"Processing question: {question[:100]}..." if len(question) > 100 else f"Processing question: {question}")
+    return client_ip, question
+
+
+def validate_doc_filters(doc_types: Optional[List[str]], filenames: Optional[List[str]]):
+    """
+    Reject document filters that cannot match the indexed corpus
+
+    Raises:
+        HTTPException: 400 naming the unknown doc types or filenames
+    """
+    documents = qa_tool.index.documents
+    unknown_types = set(doc_types or ()) - {doc.get("doc_type") for doc in documents}
+    if unknown_types:
+        raise HTTPException(status_code=400, detail=f"Unknown doc_types: {', '.join(sorted(unknown_types))}")
+    unknown_files = set(filenames or ()) - {doc.get("filename") for doc in documents}
+    if unknown_files:
+        raise HTTPException(status_code=400, detail=f"Unknown filenames: {', '.join(sorted(unknown_files))}")
+
+
+# Request coalescing (single-flight) for identical in-flight questions
+
+inflight_answers: Dict[str, asyncio.Task] = {}
+
+
+def coalescing_key(question: str, context_docs: Optional[int] = None, filters: Optional[Dict] = None) -> str:
+    """Key identical questions under the same answer configuration, document filters and corpus"""
+    normalized = " ".join(question.lower().split())
+    config = f"{qa_tool.chat_model}|{context_docs or qa_tool.default_context_docs}|{qa_tool.corpus_version}"
+    if filters and any(filters.values()):
+        config += "|" + json.dumps({name: sorted(set(values or ())) for name, values in sorted(filters.items())})
+    return hashlib.sha256(f"{config}|{normalized}".encode("utf-8")).hexdigest()
+
+
+async def reload_index(reason: str):
+    """
+    Rebuild the index from CONTEXT_DIR in the background and switch this worker to it
+
+    Requests keep being served from the current index meanwhile, and requests
+    already running finish on the version they started with. Other workers
+    switch when their watcher sees the new version.
+    """
+    async with reload_lock:
+        previous = qa_tool.corpus_version
+        logger.info(f"Reloading index ({reason})...")
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, qa_tool.rebuild_index)
+        except Exception as e:
+            logger.error(f"Index reload failed, still serving {previous}: {e}", exc_info=True)
+            return
+        if qa_tool.corpus_version != previous:
+            logger.info(f"Switched index {previous} -> {qa_tool.corpus_version}")
+        else:
+            logger.info(f"Index {previous} is already up to date")
+
+
+async def watch_index():
+    """Poll CONTEXT_DIR for edits, and the index pointer for versions published by other processes"""
+    loop = asyncio.get_running_loop()
+    signature = await loop.run_in_executor(None, qa_tool.context_signature)
+    while True:
+        await asyncio.sleep(CONTEXT_WATCH_INTERVAL_SECONDS)
+        try:
+            current = await loop.run_in_executor(None, qa_tool.context_signature)
+            if current != signature:
+                signature = current
+                await reload_index(f"change detected in {qa_tool.context_dir}/")
+            elif await loop.run_in_executor(None, qa_tool.refresh_index):
+                logger.info(f"Switched to index {qa_tool.corpus_version} published by another process")
+        except Exception as e:
+            logger.error(f"Index reload failed, still serving {qa_tool.corpus_version}: {e}", exc_info=True)
+
+
+async def coalesced_answer(question: str, filters: Optional[Dict] = None) -> Dict:
+    """
+    Answer a question, sharing one computation among identical concurrent requests
+
+    Within a worker, the computation runs in its own task that every identical
+    request awaits through asyncio.shield, so a client disconnecting (which
+    cancels its request) never cancels the answer the other requests wait for.
+    Across workers, the task holds a Redis lock and publishes its result; see
+    answer_across_workers. filters holds the doc_types / filenames keyword
+    arguments of answer_question_async.
+    """
+    filters = filters or {}
+    if not ENABLE_REQUEST_COALESCING:
+        return await qa_tool.answer_question_async(question, return_sources=True, **filters)
+
+    key = coalescing_key(question, filters=filters)
+    task = inflight_answers.get(key)
+    if task is not None:
+        logger.info(f"Coalescing question onto in-flight request {key[:12]}")
+    else:
+        task = asyncio.create_task(answer_across_workers(key, question, filters))
+        inflight_answers[key] = task
+
+        def finished(done: asyncio.Task):
+            if inflight_answers.get(key) is done:
+                del inflight_answers[key]
+            if not done.cancelled():
+                done.exception()  # Mark retrieved even if every waiting request has gone
+
+        task.add_done_callback(finished)
+    return await asyncio.shield(task)
+
+
+async def answer_across_workers(key: str, question: str, filters: Dict) -> Dict:
+    """
+    Compute an answer once across all workers sharing Redis
+
+    The first worker to take the lock computes the answer, stores it under a
+    short-lived result key and publishes on the key's channel. Other workers
+    subscribe and read the stored result, falling back to computing it
+    themselves if the leader fails or the wait times out.
+    """
+    if async_redis_client is None:
+        return await qa_tool.answer_question_async(question, return_sources=True, **filters)
+
+    lock_key = f"inflight:lock:{key}"
+    result_key = f"inflight:result:{key}"
+    channel = f"inflight:done:{key}"
+    token = str(uuid.uuid4())
+
+    try:
+        acquired = await async_redis_client.set(lock_key, token, nx=True, ex=COALESCE_WAIT_SECONDS)
+    except Exception as e:
+        logger.warning(f"Coalescing lock failed: {e}, answering without coalescing")
+        return await qa_tool.answer_question_async(question, return_sources=True, **filters)
+
+    if acquired:
+        stored = False
+        try:
+            result = await qa_tool.answer_question_async(question, return_sources=True, **filters)
+            await async_redis_client.set(result_key, json.dumps(result), ex=30)
+            stored = True
+            return result
+        finally:
+            try:
+                if await async_redis_client.get(lock_key) == token:
+                    await async_redis_client.delete(lock_key)
+                await async_redis_client.publish(channel, "ok" if stored else "failed")
+            except Exception as e:
+                logger.warning(f"Failed to release coalescing lock: {e}")
+
+    result = await wait_for_coalesced_result(lock_key, result_key, channel)
+    if result is not None:
+        logger.info(f"Served coalesced answer from another worker for {key[:12]}")
+        return result
+    return await qa_tool.answer_question_async(question, return_sources=True, **filters)
+
+
+async def wait_for_coalesced_result(lock_key: str, result_key: str, channel: str) -> Optional[Dict]:
+    """Wait for another worker's published result; None if it never arrives"""
+    pubsub = async_redis_client.pubsub()
     try:
-        logger.info(f"Processing question: {question[:100]}..." if len(question) > 100 else f"Processing question: {question}")
+        await pubsub.subscribe(channel)
+        deadline = asyncio.get_running_loop().time() + COALESCE_WAIT_SECONDS
+        while True:
+            # Check after subscribing so a result published just before is not missed
+            stored = await async_redis_client.get(result_key)
+            if stored:
+                return json.loads(stored)
+            if not await async_redis_client.exists(lock_key):
+                # Leader finished (re-read in case the result landed just now) or its lock expired
+                stored = await async_redis_client.get(result_key)
+                return json.loads(stored) if stored else None
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return None
+            await pubsub.get_message(ignore_subscribe_messages=True, timeout=min(remaining, 1.0))
+    except Exception as e:
+        logger.warning(f"Waiting for coalesced result failed: {e}")
+        return None
+    finally:
+        try:
+            await pubsub.unsubscribe(channel)
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+
+@app.post("/api/ask", response_model=AnswerResponse)
+async def ask_question(request: Request, question_req: QuestionRequest):
+    """
+    Answer a question about Zenon Network design documentation
+
+    Rate limited per IP address (configurable via environment)
+    """
+    client_ip, question = validate_question_request(request, question_req)
 
-        # Get answer with sources
-        result = qa_tool.answer_question(question, return_sources=True)
+    try:
+        # Get answer with sources (awaits OpenAI calls, keeps the event loop free);
+        # identical concurrent questions share a single computation
+        result = await coalesced_answer(
+            question, {"doc_types": question_req.doc_types, "filenames": question_req.filenames})
 
         logger.info(f"Successfully answered question from IP: {client_ip}")
 
         return AnswerResponse(
             answer=result["answer"],
-            sources=result["sources"]
+            sources=result["sources"],
+            cache_hit=result.get("cache_hit", False)
         )
     except Exception as e:
         logger.error(f"Error answering question from IP {client_ip}: {e}", exc_info=True)
@@ -498,6 +786,141 @@ async def ask_question(request: Request, question_req: QuestionRequest):
         )
 
 
+@app.post("/api/ask/batch", response_model=BatchAnswerResponse)
+async def ask_questions_batch(batch_req: BatchQuestionRequest, x_admin_token: str = Header(default="")):
+    """
+    Answer many questions in one request (evaluation runs, FAQ pre-generation)
+
+    Requires the X-Admin-Token header to match ADMIN_TOKEN; not rate limited.
+    Questions are embedded and ranked together, then answered with at most
+    BATCH_CONCURRENCY completions at a time. Results come back in question
+    order with per-question latency_ms; stats holds the aggregate latency.
+    """
+    require_admin_token(x_admin_token)
+    questions = [question.strip() for question in batch_req.questions]
+    if not questions:
+        raise HTTPException(status_code=400, detail="No questions given")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"Too many questions (max {BATCH_MAX_QUESTIONS})")
+    if any(not question or len(question) > 1000 for question in questions):
+        raise HTTPException(status_code=400, detail="Questions must be 1 to 1000 characters long")
+    if batch_req.context_docs is not None and not 1 <= batch_req.context_docs <= 50:
+        raise HTTPException(status_code=400, detail="context_docs must be between 1 and 50")
+
+    logger.info(f"Processing batch of {len(questions)} questions")
+    started = time.perf_counter()
+    results = [None] * len(questions)
+    try:
+        async for result in qa_tool.answer_questions_async(questions, batch_req.context_docs, BATCH_CONCURRENCY):
+            results[result.pop("index")] = BatchAnswer(**result)
+    except Exception as e:
+        logger.error(f"Error answering question batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error processing questions: {str(e)}")
+
+    stats = qa_tool.latency_stats([result.latency_ms for result in results], (time.perf_counter() - started) * 1000)
+    logger.info(f"Answered batch of {len(questions)} questions: {stats}")
+    return BatchAnswerResponse(results=results, stats=stats)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+
+def search_etag(corpus_version: str) -> str:
+    """Weak ETag of search results: the corpus version plus the ranking settings"""
+    return f'W/"{corpus_version}-{qa_tool.ranking_signature()}"'
+
+
+@app.get("/api/search", response_model=SearchResponse)
+async def search(request: Request, q: str = Query(..., max_length=1000), limit: int = Query(10, ge=1, le=50),
+                 doc_type: Optional[List[str]] = Query(None), filename: Optional[List[str]] = Query(None)):
+    """
+    Ranked documentation chunks for a query, without generating an answer
+
+    Repeat doc_type / filename to search only the matching documents.
+
+    Responses carry a weak ETag of the corpus version and ranking settings and
+    may be reused for SEARCH_CACHE_MAX_AGE_SECONDS; after that, a revalidation
+    with If-None-Match gets 304 Not Modified until the documents or ranking
+    settings change. Rate limited per IP with its own allowance
+    (SEARCH_RATE_LIMIT_MAX_REQUESTS); revalidations count too.
+    """
+    query = q.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Query cannot be empty")
+    validate_doc_filters(doc_type, filename)
+    client_ip = get_client_ip(request)
+    if not check_rate_limit(client_ip, "search", SEARCH_RATE_LIMIT_MAX_REQUESTS):
+        raise HTTPException(
+            status_code=429,
+            detail={
+                "error": "Rate limit exceeded",
+                "message": f"You have exceeded the limit of {SEARCH_RATE_LIMIT_MAX_REQUESTS} searches per {RATE_LIMIT_WINDOW_SECONDS // 60} minutes. Please try again later.",
+                "retry_after_minutes": RATE_LIMIT_WINDOW_SECONDS // 60
+            }
+        )
+
+    cache_headers = {"Cache-Control": f"public, max-age={SEARCH_CACHE_MAX_AGE_SECONDS}"}
+    etag = search_etag(qa_tool.corpus_version)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, **cache_headers})
+
+    try:
+        corpus_version, results = await qa_tool.search_async(query, limit, doc_type, filename)
+    except Exception as e:
+        logger.error(f"Error searching for IP {client_ip}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error processing search: {str(e)}")
+
+    body = SearchResponse(query=query, corpus_version=corpus_version, results=results)
+    return JSONResponse(content=body.model_dump(), headers={"ETag": search_etag(corpus_version), **cache_headers})
+
+
+def format_sse(event: str, data: Dict) -> str:
+    """Encode one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/ask/stream")
+async def ask_question_stream(request: Request, question_req: QuestionRequest):
+    """
+    Answer a question as a server-sent event stream
+
+    Emits a `sources` event first, then `token` events as the model generates
+    the answer, and finally `done` (or `error`). Same rate limit as /api/ask.
+    """
+    client_ip, question = validate_question_request(request, question_req)
+
+    async def event_stream():
+        try:
+            last_event = None
+            async for event in qa_tool.answer_question_stream_async(
+                    question, doc_types=question_req.doc_types, filenames=question_req.filenames):
+                last_event = event.pop("type")
+                if last_event == "error":
+                    logger.error(f"Error streaming answer to IP {client_ip}: {event.get('message')}")
+                yield format_sse(last_event, event)
+            if last_event == "done":
+                logger.info(f"Successfully streamed answer to IP: {client_ip}")
+        except Exception as e:
+            logger.error(f"Error streaming answer to IP {client_ip}: {e}", exc_info=True)
+            yield format_sse("error", {"message": f"Error processing question: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Disable proxy buffering so tokens arrive as generated
+        }
+    )
+
+
 @app.post("/api/sessions", response_model=SessionResponse)
 async def create_session(session_data: SessionCreate):
     """
@@ -634,6 +1057,7 @@ async def health_check():
         "status": "healthy",
         "environment": ENVIRONMENT,
         "documents_loaded": len(qa_tool.documents) if qa_tool else 0,
+        "corpus_version": qa_tool.corpus_version if qa_tool else None,
         "rate_limit": f"{RATE_LIMIT_MAX_REQUESTS} per {RATE_LIMIT_WINDOW_SECONDS // 60} minutes",
         "dependencies": {}
     }
@@ -656,6 +1080,10 @@ async def health_check():
         health_status["dependencies"]["qa_tool"] = "not_initialized"
     else:
         health_status["dependencies"]["qa_tool"] = "healthy"
+        health_status["query_embedding_cache"] = qa_tool.query_cache.stats()
+        health_status["answer_cache"] = qa_tool.answer_cache.stats()
+        if qa_tool.enable_compression:
+            health_status["summary_cache"] = qa_tool.summary_cache.stats()
 
     # Return appropriate status code
     status_code = 200 if health_status["status"] in ["healthy", "degraded"] else 503
@@ -663,10 +1091,102 @@ async def health_check():
     return JSONResponse(content=health_status, status_code=status_code)
 
 
+def require_admin_token(x_admin_token: str):
+    """Raise 403 unless ADMIN_TOKEN is set and the X-Admin-Token header matches it"""
+    # Compare bytes: compare_digest rejects str arguments with non-ASCII characters
+    if not ADMIN_TOKEN or not hmac.compare_digest(x_admin_token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.post("/api/admin/reload", status_code=202)
+async def admin_reload(x_admin_token: str = Header(default="")):
+    """
+    Rebuild the index from CONTEXT_DIR without a restart
+
+    Requires the X-Admin-Token header to match ADMIN_TOKEN. The rebuild runs in
+    the background; poll /api/health for the new corpus_version.
+    """
+    require_admin_token(x_admin_token)
+    if reload_lock.locked():
+        return {"status": "already_reloading", "corpus_version": qa_tool.corpus_version}
+    task = asyncio.create_task(reload_index("admin request"))
+    reload_tasks.add(task)  # Hold a reference until it finishes
+    task.add_done_callback(reload_tasks.discard)
+    return {"status": "reloading", "corpus_version": qa_tool.corpus_version}
+
+
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    Readiness probe, separate from the /api/health liveness check
+
+    Returns 200 once this worker has its index open and can answer questions,
+    503 before that or while the shared retrieval service (RETRIEVAL_SOCKET) is
+    not accepting connections. Load balancers should route on this endpoint.
+    """
+    if not qa_tool:
+        return JSONResponse(content={"ready": False}, status_code=503)
+    if qa_tool.retrieval is not None and not await retrieval_service_reachable():
+        return JSONResponse(content={"ready": False, "retrieval_service": "unreachable"}, status_code=503)
+    return {"ready": True, "corpus_version": qa_tool.corpus_version, "chunks": len(qa_tool.chunks)}
+
+
+async def retrieval_service_reachable(timeout: float = 1.0) -> bool:
+    """Whether the retrieval service accepts connections on RETRIEVAL_SOCKET"""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_unix_connection(RETRIEVAL_SOCKET), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
 # Mount static files (CSS, JS, etc.)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
+def start_retrieval_service(timeout: float = 60.0) -> subprocess.Popen:
+    """
+    Start `zenon_ai.py serve-retrieval` on RETRIEVAL_SOCKET and wait until it accepts connections
+
+    Raises RuntimeError if the process exits or does not listen within timeout.
+    """
+    socket_path = Path(RETRIEVAL_SOCKET)
+    if socket_path.is_socket():
+        socket_path.unlink()
+    logger.info(f"Starting retrieval service on {socket_path}...")
+    service = subprocess.Popen([sys.executable, str(Path(__file__).with_name("zenon_ai.py")), "serve-retrieval"])
+
+    deadline = time.monotonic() + timeout
+    while not socket_path.is_socket():
+        if service.poll() is not None or time.monotonic() > deadline:
+            service.kill()
+            raise RuntimeError("Retrieval service failed to start")
+        time.sleep(0.1)
+    return service
+
+
+def supervise_retrieval_service(service: subprocess.Popen, stopping: threading.Event):
+    """
+    Restart the retrieval service whenever it exits, and terminate it once stopping is set
+
+    Workers cannot rank questions without it, so if a restart fails the whole
+    server is stopped (SIGTERM to this process) instead of answering every
+    question without context.
+    """
+    while not stopping.wait(1.0):
+        if service.poll() is None:
+            continue
+        logger.error(f"Retrieval service exited with code {service.returncode}, restarting...")
+        try:
+            service = start_retrieval_service()
+        except RuntimeError as e:
+            logger.critical(f"{e}; stopping the server")
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
+    service.terminate()
+
+
 def main():
     """Run the web server"""
     # Determine number of workers based on environment
@@ -681,23 +1201,52 @@ def main():
     logger.info(f"Workers: {workers}")
     logger.info(f"Reload: {reload}")
     logger.info(f"Port: {port}")
+    # Build or update the index once in this process, so every worker (including
+    # workers recycled after limit_max_requests) only maps the finished files
+    if not INDEX_READ_ONLY:
+        context_dir = os.getenv('CONTEXT_DIR', 'context')
+        logger.info(f"Preparing index for {context_dir}/...")
+        try:
+            ZenonQA(context_dir)
+        except Exception as e:
+            logger.error(f"ERROR building index: {e}", exc_info=True)
+            sys.exit(1)
+        os.environ["INDEX_READ_ONLY"] = "true"  # Inherited by the worker processes
+
+    supervisor = None
+    stopping = threading.Event()
+    if RETRIEVAL_SOCKET:
+        try:
+            retrieval_service = start_retrieval_service()
+        except RuntimeError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        supervisor = threading.Thread(target=supervise_retrieval_service, args=(retrieval_service, stopping),
+                                      name="retrieval-supervisor", daemon=True)
+        supervisor.start()
+
     logger.info("Starting server...")
     logger.info(f"Access the interface at: http://localhost:{port}")
     logger.info("Press Ctrl+C to stop the server")
     logger.info("="*60)
 
-    uvicorn.run(
-        "web_app:app",
-        host="0.0.0.0",
-        port=port,
-        workers=workers,
-        reload=reload,
-        log_level=LOG_LEVEL.lower(),
-        access_log=ENVIRONMENT == "development",
-        timeout_keep_alive=75,
-        limit_concurrency=1000,
-        limit_max_requests=10000,
-    )
+    try:
+        uvicorn.run(
+            "web_app:app",
+            host="0.0.0.0",
+            port=port,
+            workers=workers,
+            reload=reload,
+            log_level=LOG_LEVEL.lower(),
+            access_log=ENVIRONMENT == "development",
+            timeout_keep_alive=75,
+            limit_concurrency=1000,
+            limit_max_requests=10000,
+        )
+    finally:
+        if supervisor:
+            stopping.set()
+            supervisor.join()
 
 
 if __name__ == "__main__":
@@ -14,47 +14,1438 @@ Features:
 Based on kaine-ai (https://github.com/0x3639/kaine-ai)
 """
 
+import argparse
+import asyncio
+import base64
+import bisect
+import contextlib
+import fcntl
+import hashlib
 import json
 import os
+import queue
+import random
+import re
+import shutil
+import socket
+import socketserver
+import struct
 import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable
 import numpy as np
-from openai import OpenAI
-import tiktoken
 import pickle
 from pathlib import Path
 from dotenv import load_dotenv
-from collections import defaultdict
-from math import log
+from collections import Counter, OrderedDict, defaultdict
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Bump when the on-disk index layout changes; older indexes are rebuilt
+INDEX_FORMAT_VERSION = 5
+
+NO_CONTEXT_ANSWER = "I couldn't find any relevant documentation to answer your question."
+
+# Joins non-adjacent spans of one document, and document blocks, in the packed context
+CONTEXT_SPAN_SEPARATOR = "\n...\n"
+CONTEXT_DOC_SEPARATOR = "\n\n"
+
+# Words ignored when deciding whether two questions ask about the same thing
+INTENT_STOPWORDS = frozenset(
+    "a an and are as at be by can could do does for from how i in is it me of on or "
+    "please should tell that the this to what when where which who why will with would "
+    "you your".split())
+
+# API limit on inputs per embeddings request
+EMBEDDING_MAX_BATCH_INPUTS = 2048
+
+# The legacy pickle caches do not record their model; they were built with this
+# default, so they are only reused under it
+LEGACY_EMBEDDING_MODEL = 'text-embedding-3-large'
+LEGACY_EMBEDDING_DIM = 3072
+
+# Markdown headings that start a section when chunking by sections
+HEADING_PATTERN = re.compile(rb'#{1,2}[ \t]+\S')
+# Sections shorter than this (a bare heading, the document header) join a neighbour
+MIN_SECTION_TOKENS = 64
+
+# Query parts matched literally by the substring index (see _exact_terms)
+EXACT_PHRASE_PATTERN = re.compile(r'"([^"]+)"|`([^`]+)`')
+IDENTIFIER_PATTERN = re.compile(r'[a-z]\d|\d[a-z]|\w[_.:/#-]\w', re.IGNORECASE)
+EXACT_TERM_STRIP = '.,;:!?()[]{}<>\'"'
+
+# Retrieval service wire format (little-endian), one request/response pair at a time
+# per connection. A request is the header followed by the UTF-8 query and the UTF-8
+# JSON document filter ([doc_types, filenames], empty for none). A response is
+# the header followed by the query embedding (float32 x dim), chunk ids (int32 x n)
+# and scores (float32 x n), or by a UTF-8 error message when status is non-zero.
+RETRIEVAL_REQUEST = struct.Struct('<HfII')  # top_k, semantic_weight, query length, filter length
+RETRIEVAL_RESPONSE = struct.Struct('<B16sHII')  # status, corpus_version, n results, dim, error length
+
+
+def _top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without sorting the whole array"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        top = np.argpartition(scores, -k)[-k:]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(scores[top])[::-1]]
+
+
+def _term_hash(term: str) -> int:
+    """Stable 64-bit hash of a keyword term (vocabulary lookups without a pickled dict)"""
+    return int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _chunk_hash(text: str) -> bytes:
+    """128-bit content hash identifying a chunk's text (embedding reuse across rebuilds)"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+def _doc_filter(doc_types: Iterable[str] = None, filenames: Iterable[str] = None):
+    """Canonical, hashable form of the retrieval filters, or None when nothing is filtered"""
+    if not doc_types and not filenames:
+        return None
+    return tuple(sorted(set(doc_types or ()))), tuple(sorted(set(filenames or ())))
+
+
+def _exact_terms(query: str) -> List[str]:
+    """
+    Literal patterns of a query for the substring index
+
+    Quoted ("...") or backticked phrases, plus identifier-like words: those with a
+    letter next to a digit or inner punctuation, such as 0x02, OP_RETURN or
+    embedded.token.
+    """
+    terms = [a or b for a, b in EXACT_PHRASE_PATTERN.findall(query)]
+    for word in EXACT_PHRASE_PATTERN.sub(' ', query).split():
+        word = word.strip(EXACT_TERM_STRIP)
+        if re.search(r'\w\w', word) and IDENTIFIER_PATTERN.search(word):  # Not e.g, i.e
+            terms.append(word)
+    return [term.strip() for term in dict.fromkeys(terms) if term.strip()]
+
+
+def _load_array(path: Path) -> np.ndarray:
+    """Open a .npy file as a read-only memory map shared through the OS page cache"""
+    return np.load(path, mmap_mode='r')
+
+
+def _save_array(path: Path, array: np.ndarray):
+    np.save(path, np.ascontiguousarray(array))
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process with this PID exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by another user
+    return True
+
+
+class KeywordIndex:
+    """
+    Sparse TF-IDF keyword index stored as term-major posting lists (CSR layout)
+
+    Each posting carries a precomputed weight of idf^2 * normalized TF, so a query
+    only touches the postings of its own terms. Scores match the dense TF-IDF dot
+    product previously computed per chunk.
+    """
+
+    FILES = ('kw_term_hashes', 'kw_term_ids', 'kw_indptr', 'kw_chunk_ids', 'kw_tf', 'kw_weights',
+             'kw_max_weights')
+
+    def __init__(self, term_hashes: np.ndarray, term_ids: np.ndarray, indptr: np.ndarray,
+                 chunk_ids: np.ndarray, tf: np.ndarray, weights: np.ndarray, max_weights: np.ndarray,
+                 n_chunks: int):
+        self.term_hashes = term_hashes  # Sorted 64-bit term hashes
+        self.term_ids = term_ids  # Term id for each entry of term_hashes
+        self.indptr = indptr  # (n_terms + 1,) offsets into chunk_ids/tf/weights
+        self.chunk_ids = chunk_ids  # Sorted ascending within each term's posting list
+        self.tf = tf  # Normalized TF per posting, kept so statistics can be updated in place
+        self.weights = weights
+        self.max_weights = max_weights  # Upper bound of each term's weight, for MaxScore pruning
+        self.n_chunks = n_chunks
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.indptr) - 1
+
+    @staticmethod
+    def _tokenize_chunks(texts: Iterable[str], term_id, first_chunk_id: int = 0):
+        """Posting triples (term id, chunk id, normalized TF) for a sequence of chunk texts"""
+        terms_out, chunks_out, tf_out = [], [], []
+        for chunk_id, text in enumerate(texts, start=first_chunk_id):
+            terms = text.lower().split()
+            for term, count in Counter(terms).items():
+                terms_out.append(term_id(term))
+                chunks_out.append(chunk_id)
+                tf_out.append(count / (len(terms) + 1))  # Normalized TF
+        return terms_out, chunks_out, tf_out
+
+    @classmethod
+    def _from_postings(cls, terms: np.ndarray, chunks: np.ndarray, tf: np.ndarray,
+                       hashes_by_id: np.ndarray, n_chunks: int) -> 'KeywordIndex':
+        """
+        Derive idf, weights and the CSR layout from unordered posting triples
+
+        Terms without postings (their chunks were all removed by an update) are
+        dropped, and the rest are numbered in hash order, so an updated index has
+        exactly the arrays a full build over the same chunks produces.
+        """
+        df = np.bincount(terms, minlength=len(hashes_by_id))
+        live = np.flatnonzero(df)
+        live = live[np.argsort(hashes_by_id[live], kind='stable')]
+        new_ids = np.full(len(hashes_by_id), -1, dtype=np.int64)
+        new_ids[live] = np.arange(len(live))
+        terms, hashes, df = new_ids[terms], hashes_by_id[live], df[live]
+        n_terms = len(live)
+        idf = np.log(max(n_chunks, 1) / (df + 1))  # Smoothing
+
+        # Term-major order with chunk ids ascending within each term
+        order = np.lexsort((chunks, terms))
+        terms, chunks, tf = terms[order], chunks[order].astype(np.int32), tf[order].astype(np.float32)
+        indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        weights = (idf[terms] ** 2 * tf).astype(np.float32)
+
+        max_weights = np.zeros(n_terms, dtype=np.float32)
+        if n_terms:
+            max_weights[:] = np.maximum.reduceat(weights, indptr[:-1])
+
+        return cls(hashes, np.arange(n_terms, dtype=np.int64), indptr, chunks, tf, weights,
+                   max_weights, n_chunks)
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> 'KeywordIndex':
+        """Build the index from chunk texts using simple whitespace tokenization"""
+        texts = list(texts)
+        vocab = {}
+        terms, chunks, tf = cls._tokenize_chunks(texts, lambda term: vocab.setdefault(term, len(vocab)))
+        hashes = np.fromiter((_term_hash(term) for term in vocab), dtype=np.uint64, count=len(vocab))
+        return cls._from_postings(np.asarray(terms, dtype=np.int64), np.asarray(chunks, dtype=np.int64),
+                                  np.asarray(tf, dtype=np.float64), hashes, len(texts))
+
+    def update(self, kept_rows: np.ndarray, new_rows: np.ndarray, added: List[tuple],
+               n_chunks: int) -> 'KeywordIndex':
+        """
+        Produce an updated index without re-tokenizing unchanged chunks
+
+        Args:
+            kept_rows: Chunk ids in this index whose postings are carried over
+            new_rows: Chunk id of each kept chunk in the updated index
+            added: (chunk id, text) pairs for chunks to tokenize and add
+            n_chunks: Number of chunks in the updated index
+
+        Document frequencies and idf are recomputed from the merged postings, so
+        scores are identical to a full rebuild over the same chunks.
+        """
+        row_map = np.full(self.n_chunks, -1, dtype=np.int64)
+        row_map[np.asarray(kept_rows, dtype=np.int64)] = new_rows
+        posting_terms = np.repeat(np.arange(self.n_terms), np.diff(self.indptr))
+        mapped = row_map[self.chunk_ids]
+        keep = mapped >= 0
+
+        hashes_by_id = np.empty(self.n_terms, dtype=np.uint64)
+        hashes_by_id[self.term_ids] = self.term_hashes
+        new_terms = {}
+
+        def term_id(term):
+            tid = self._term_id(term)
+            if tid is None:
+                tid = new_terms.setdefault(term, self.n_terms + len(new_terms))
+            return tid
+
+        added_terms, added_chunks, added_tf = [], [], []
+        for chunk_id, text in added:
+            t, _, f = self._tokenize_chunks([text], term_id)
+            added_terms += t
+            added_chunks += [chunk_id] * len(t)
+            added_tf += f
+        if new_terms:
+            extra = np.fromiter((_term_hash(term) for term in new_terms), dtype=np.uint64, count=len(new_terms))
+            hashes_by_id = np.concatenate([hashes_by_id, extra])
+        print(f"[Index] Keyword index: kept {int(keep.sum())} postings, tokenized {len(added)} chunks, "
+              f"{len(new_terms)} new terms")
+
+        return self._from_postings(
+            np.concatenate([posting_terms[keep], np.asarray(added_terms, dtype=np.int64)]),
+            np.concatenate([mapped[keep], np.asarray(added_chunks, dtype=np.int64)]),
+            np.concatenate([np.asarray(self.tf[keep], dtype=np.float64), np.asarray(added_tf, dtype=np.float64)]),
+            hashes_by_id, n_chunks)
+
+    def save(self, index_dir: Path):
+        for name in self.FILES:
+            _save_array(index_dir / f"{name}.npy", getattr(self, name[3:]))
+
+    @classmethod
+    def open(cls, index_dir: Path, n_chunks: int) -> 'KeywordIndex':
+        """Memory-map a saved index; nothing is deserialized into the heap"""
+        return cls(*(_load_array(index_dir / f"{name}.npy") for name in cls.FILES), n_chunks)
+
+    def _term_id(self, term: str):
+        h = np.uint64(_term_hash(term))
+        pos = np.searchsorted(self.term_hashes, h)
+        if pos < len(self.term_hashes) and self.term_hashes[pos] == h:
+            return int(self.term_ids[pos])
+        return None
+
+    def _query_weights(self, query_terms: List[str]) -> List[tuple]:
+        """(term_id, query weight) pairs for the terms present in the vocabulary"""
+        norm = len(query_terms) + 1
+        weights = []
+        for term, count in Counter(query_terms).items():
+            tid = self._term_id(term)
+            if tid is not None and self.indptr[tid + 1] > self.indptr[tid]:
+                weights.append((tid, count / norm))
+        return weights
+
+    def _postings(self, tid: int):
+        start, end = self.indptr[tid], self.indptr[tid + 1]
+        return self.chunk_ids[start:end], self.weights[start:end]
+
+    def score(self, query_terms: List[str], mask: np.ndarray = None):
+        """
+        Score every chunk containing at least one query term
+
+        Args:
+            mask: Optional boolean array over chunks; postings of other chunks are
+                dropped before they are accumulated
+
+        Returns:
+            (chunk_ids, scores) arrays; chunks not listed score zero
+        """
+        query_weights = self._query_weights(query_terms)
+        if not query_weights:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        ids = np.concatenate([self._postings(tid)[0] for tid, _ in query_weights])
+        contributions = np.concatenate([self._postings(tid)[1] * qw for tid, qw in query_weights])
+        if mask is not None:
+            keep = mask[ids]
+            ids, contributions = ids[keep], contributions[keep]
+        unique_ids, inverse = np.unique(ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions).astype(np.float32)
+        return unique_ids, scores
+
+    def score_ids(self, query_terms: List[str], chunk_ids: np.ndarray) -> np.ndarray:
+        """Keyword scores of the given sorted chunk ids only, by binary search into each posting list"""
+        scores = np.zeros(len(chunk_ids), dtype=np.float32)
+        if not len(chunk_ids):
+            return scores
+        for tid, qw in self._query_weights(query_terms):
+            ids, weights = self._postings(tid)
+            pos = np.minimum(np.searchsorted(ids, chunk_ids), len(ids) - 1)
+            hit = ids[pos] == chunk_ids
+            scores[hit] += qw * weights[pos[hit]]
+        return scores
+
+    def top_k(self, query_terms: List[str], k: int, mask: np.ndarray = None):
+        """
+        Top-k chunks by keyword score with MaxScore early termination
+
+        Terms are processed in decreasing order of their maximum contribution. Once
+        the remaining terms cannot lift an unseen chunk past the current k-th best
+        score, only existing candidates are updated (by binary search into the
+        remaining posting lists) and no new chunks are admitted. Frequent terms
+        ("what", "the") have the smallest bounds, so their long posting lists are
+        usually only probed, not merged.
+
+        Args:
+            mask: Optional boolean array over chunks, as in score()
+
+        Returns:
+            (chunk_ids, scores) arrays, best first
+        """
+        query_weights = self._query_weights(query_terms)
+        if not query_weights or k <= 0:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+
+        bounds = np.array([qw * self.max_weights[tid] for tid, qw in query_weights])
+        order = np.argsort(bounds)[::-1]
+        remaining = np.cumsum(bounds[order][::-1])[::-1]  # Bound of terms order[i:]
+
+        cand_ids = np.empty(0, dtype=np.int32)
+        cand_scores = np.empty(0, dtype=np.float64)
+        for i, term_pos in enumerate(order):
+            tid, qw = query_weights[term_pos]
+            ids, weights = self._postings(tid)
+            if mask is not None:
+                keep = mask[ids]
+                ids, weights = ids[keep], weights[keep]
+            if not len(ids):
+                continue
+
+            threshold = np.partition(cand_scores, -k)[-k] if len(cand_scores) >= k else 0.0
+            if len(cand_scores) >= k and remaining[i] <= threshold:
+                # Drop candidates that can no longer reach the top-k
+                keep = cand_scores + remaining[i] >= threshold
+                cand_ids, cand_scores = cand_ids[keep], cand_scores[keep]
+                pos = np.minimum(np.searchsorted(ids, cand_ids), len(ids) - 1)
+                hit = ids[pos] == cand_ids
+                cand_scores[hit] += qw * weights[pos[hit]]
+                continue
+
+            merged = np.union1d(cand_ids, ids)
+            merged_scores = np.zeros(len(merged))
+            merged_scores[np.searchsorted(merged, cand_ids)] = cand_scores
+            merged_scores[np.searchsorted(merged, ids)] += qw * weights
+            cand_ids, cand_scores = merged, merged_scores
+
+        top = _top_k_indices(cand_scores, k)
+        return cand_ids[top], cand_scores[top].astype(np.float32)
+
+
+class SubstringIndex:
+    """
+    Suffix array over the document text blob for exact phrase and identifier lookups
+
+    Whitespace tokens keep punctuation attached and lose word order, so literal
+    queries such as `0x02`, `embedded.token` or a quoted sentence are matched
+    here byte for byte instead. All occurrences of a pattern are one contiguous
+    range of the sorted suffixes, found with two binary searches (O(m log n) for
+    m pattern bytes); no pass over the text is needed. Comparisons lowercase
+    ASCII only, so byte offsets stay valid and content (lowercased at index
+    time) matches case-insensitively.
+    """
+
+    FILES = ('suffix_array',)
+
+    def __init__(self, suffix_array: np.ndarray, text_blob: np.ndarray, byte_ranges: np.ndarray):
+        self.suffix_array = suffix_array  # Start offsets of all suffixes of text_blob, sorted
+        self.text_blob = text_blob
+        self.byte_ranges = byte_ranges  # Chunk [start, end) offsets, ascending in both columns
+
+    @staticmethod
+    def _sort_suffixes(text: bytes) -> np.ndarray:
+        """Suffix array by prefix doubling: suffixes sorted on 2k bytes from the ranks of k bytes"""
+        n = len(text)
+        rank = np.frombuffer(text.lower(), dtype=np.uint8).astype(np.int64) + 1
+        suffix_array = np.arange(n)
+        k = 1
+        while k < n:
+            second = np.zeros(n, dtype=np.int64)  # 0 past the end: shorter suffixes sort first
+            second[:n - k] = rank[k:]
+            key = rank * (max(int(rank.max()), n) + 1) + second  # Multiplier above every rank: no collisions
+            suffix_array = np.argsort(key)
+            sorted_key = key[suffix_array]
+            rank[suffix_array] = np.cumsum(np.r_[True, sorted_key[1:] != sorted_key[:-1]])
+            if rank[suffix_array[-1]] == n:
+                break  # All ranks distinct
+            k *= 2
+        return suffix_array.astype(np.int32 if n < 2 ** 31 else np.int64)
+
+    @classmethod
+    def build(cls, text_blob: np.ndarray, byte_ranges: np.ndarray) -> 'SubstringIndex':
+        return cls(cls._sort_suffixes(text_blob.tobytes()), text_blob, byte_ranges)
+
+    def save(self, index_dir: Path):
+        _save_array(index_dir / 'suffix_array.npy', self.suffix_array)
+
+    @classmethod
+    def open(cls, index_dir: Path, chunks: 'ChunkStore'):
+        """The saved suffix array over the chunk store's text, or None for indexes built without one"""
+        if not all((index_dir / f"{name}.npy").exists() for name in cls.FILES):
+            return None
+        return cls(_load_array(index_dir / 'suffix_array.npy'), chunks.text_blob, chunks.byte_ranges)
+
+    def find(self, pattern: str) -> np.ndarray:
+        """Blob offsets of every case-insensitive occurrence of pattern, in suffix order"""
+        key = pattern.lower().encode('utf-8')
+        if not key:
+            return np.empty(0, dtype=np.int64)
+
+        def prefix(pos):
+            return self.text_blob[pos:pos + len(key)].tobytes().lower()
+
+        start = bisect.bisect_left(self.suffix_array, key, key=prefix)
+        end = bisect.bisect_right(self.suffix_array, key, lo=start, key=prefix)
+        return np.asarray(self.suffix_array[start:end], dtype=np.int64)
+
+    def chunk_ids(self, pattern: str) -> np.ndarray:
+        """Sorted ids of the chunks containing pattern in full"""
+        positions = self.find(pattern)
+        if not len(positions):
+            return np.empty(0, dtype=np.int64)
+        # Chunks covering [pos, pos + m) start at or before pos and end at or after pos + m;
+        # both columns ascend, so those chunks form a range
+        first = np.searchsorted(self.byte_ranges[:, 1], positions + len(pattern.lower().encode('utf-8')))
+        last = np.searchsorted(self.byte_ranges[:, 0], positions, side='right')
+        counts = np.maximum(last - first, 0)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.unique(np.repeat(first, counts) + offsets)
+
+    def score(self, patterns: List[str], mask: np.ndarray = None):
+        """
+        Fraction of the patterns each chunk contains
+
+        Args:
+            mask: Optional boolean array over chunks; other chunks are dropped
+
+        Returns:
+            (chunk_ids, scores) arrays; chunks not listed score zero
+        """
+        if not patterns:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        ids = np.concatenate([self.chunk_ids(pattern) for pattern in patterns])
+        if mask is not None:
+            ids = ids[mask[ids]]
+        unique_ids, counts = np.unique(ids, return_counts=True)
+        return unique_ids, (counts / len(patterns)).astype(np.float32)
+
+
+class IVFIndex:
+    """
+    Inverted-file (IVF-flat) approximate nearest-neighbour index over chunk embeddings
+
+    Embeddings are clustered with spherical k-means; each chunk is listed under its
+    nearest centroid, with list members stored contiguously. A query scores the
+    centroids, then only the chunks in the nprobe best lists, so the work per query
+    grows with nprobe * n / n_lists instead of n. Raising nprobe trades latency
+    for recall; nprobe = n_lists is an exact search.
+    """
+
+    FILES = ('ivf_centroids', 'ivf_offsets', 'ivf_ids')
+
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, ids: np.ndarray):
+        self.centroids = centroids  # (n_lists, dim) float32, unit length
+        self.offsets = offsets  # (n_lists + 1,) start of each list in ids
+        self.ids = ids  # chunk ids grouped by list
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @staticmethod
+    def _assign(centroids: np.ndarray, vectors: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+        """Nearest centroid of every vector, in batches to bound the score matrix"""
+        labels = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), batch_size):
+            labels[start:start + batch_size] = np.argmax(vectors[start:start + batch_size] @ centroids.T, axis=1)
+        return labels
+
+    @classmethod
+    def _from_labels(cls, centroids: np.ndarray, labels: np.ndarray) -> 'IVFIndex':
+        ids = np.argsort(labels, kind='stable').astype(np.int32)
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=len(centroids)), out=offsets[1:])
+        return cls(centroids, offsets, ids)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, n_lists: int = None, iterations: int = 10,
+              max_train_per_list: int = 64, seed: int = 0) -> 'IVFIndex':
+        """Train centroids on a sample of the embeddings, then list every chunk"""
+        rng = np.random.default_rng(seed)
+        n = len(embeddings)
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(n))
+        n_lists = max(1, min(n_lists, n))
+
+        sample = embeddings[np.sort(rng.choice(n, size=min(n, n_lists * max_train_per_list), replace=False))]
+        sample = np.ascontiguousarray(sample, dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = cls._assign(centroids, sample)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=n_lists) == 0
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]  # Re-seed
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            centroids = sums / norms
+
+        return cls._from_labels(centroids, cls._assign(centroids, embeddings))
+
+    def update(self, kept_rows: np.ndarray, new_rows: np.ndarray, embeddings: np.ndarray,
+               added_rows: np.ndarray) -> 'IVFIndex':
+        """
+        Keep the trained centroids and list assignments of unchanged chunks
+
+        Only the added chunks are assigned to a list. Call build() instead once the
+        corpus has grown well past what the centroids were trained on.
+        """
+        labels = np.empty(len(embeddings), dtype=np.int32)
+        old_labels = np.repeat(np.arange(self.n_lists, dtype=np.int32), np.diff(self.offsets))
+        by_row = np.empty(len(self.ids), dtype=np.int32)
+        by_row[self.ids] = old_labels
+        labels[np.asarray(new_rows, dtype=np.int64)] = by_row[np.asarray(kept_rows, dtype=np.int64)]
+        added_rows = np.asarray(added_rows, dtype=np.int64)
+        if len(added_rows):
+            labels[added_rows] = self._assign(self.centroids, embeddings[added_rows])
+        return self._from_labels(np.asarray(self.centroids), labels)
+
+    def save(self, index_dir: Path):
+        for name in self.FILES:
+            _save_array(index_dir / f"{name}.npy", getattr(self, name[4:]))
+
+    @classmethod
+    def open(cls, index_dir: Path) -> 'IVFIndex':
+        """The saved IVF index, or None when the index was built without one"""
+        if not all((index_dir / f"{name}.npy").exists() for name in cls.FILES):
+            return None
+        return cls(*(_load_array(index_dir / f"{name}.npy") for name in cls.FILES))
+
+    def search(self, query_embedding: np.ndarray, nprobe: int) -> np.ndarray:
+        """Sorted chunk ids in the nprobe lists whose centroids are closest to the query"""
+        probe = _top_k_indices(self.centroids @ query_embedding, nprobe)
+        return np.sort(np.concatenate([self.ids[self.offsets[p]:self.offsets[p + 1]] for p in probe]))
+
+
+class QuantizedEmbeddings:
+    """
+    int8 scalar-quantized copy of the embedding matrix for first-pass scoring
+
+    Each row is scaled so its largest component maps to 127, which keeps 3072-d
+    unit vectors at 1 byte per dimension (4x smaller than float32) with cosine
+    errors far below the gaps between the top results. Callers rescore a
+    shortlist against the full-precision vectors.
+    """
+
+    FILES = ('emb_int8_codes', 'emb_int8_scales')
+    BLOCK_ROWS = 16384  # Rows converted to float32 at a time while scoring
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes  # (n_chunks, dim) int8
+        self.scales = scales  # (n_chunks,) float32, code * scale approximates the component
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray) -> 'QuantizedEmbeddings':
+        codes = np.empty(embeddings.shape, dtype=np.int8)
+        scales = np.empty(len(embeddings), dtype=np.float32)
+        for start in range(0, len(embeddings), cls.BLOCK_ROWS):
+            block = np.asarray(embeddings[start:start + cls.BLOCK_ROWS], dtype=np.float32)
+            scale = np.abs(block).max(axis=1) / 127
+            scale[scale == 0] = 1
+            codes[start:start + len(block)] = np.rint(block / scale[:, None])
+            scales[start:start + len(block)] = scale
+        return cls(codes, scales)
+
+    def save(self, index_dir: Path):
+        for name in self.FILES:
+            _save_array(index_dir / f"{name}.npy", getattr(self, name[9:]))
+
+    @classmethod
+    def open(cls, index_dir: Path):
+        """The saved quantized embeddings, or None when the index was built without them"""
+        if not all((index_dir / f"{name}.npy").exists() for name in cls.FILES):
+            return None
+        return cls(*(_load_array(index_dir / f"{name}.npy") for name in cls.FILES))
+
+    def score(self, query_embedding: np.ndarray, ids: np.ndarray = None) -> np.ndarray:
+        """Approximate similarity of every chunk, or of the chunks in ids, to the query"""
+        if ids is not None:
+            return (self.codes[ids].astype(np.float32) @ query_embedding) * self.scales[ids]
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), self.BLOCK_ROWS):
+            end = start + self.BLOCK_ROWS
+            scores[start:end] = (self.codes[start:end].astype(np.float32) @ query_embedding) * self.scales[start:end]
+        return scores
+
+
+class CoarseEmbeddings:
+    """
+    Leading dimensions of every embedding, renormalized, for a cheap first pass
+
+    text-embedding-3 vectors are trained so that a prefix is itself a usable
+    embedding; truncating to d dimensions and renormalizing gives what the API
+    returns for dimensions=d. Scoring 256 of 3072 dimensions reads 12x less data,
+    and callers rescore a shortlist against the full vectors.
+    """
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors  # (n_chunks, dims) float32, unit length
+
+    @property
+    def dims(self) -> int:
+        return self.vectors.shape[1]
+
+    @staticmethod
+    def truncate(vectors: np.ndarray, dims: int) -> np.ndarray:
+        short = np.array(vectors[..., :dims], dtype=np.float32)
+        norms = np.linalg.norm(short, axis=-1, keepdims=True)
+        norms[norms == 0] = 1
+        return short / norms
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, dims: int, block_rows: int = 16384) -> 'CoarseEmbeddings':
+        vectors = np.empty((len(embeddings), dims), dtype=np.float32)
+        for start in range(0, len(embeddings), block_rows):
+            vectors[start:start + block_rows] = cls.truncate(embeddings[start:start + block_rows], dims)
+        return cls(vectors)
+
+    def save(self, index_dir: Path):
+        _save_array(index_dir / 'embeddings_coarse.npy', self.vectors)
+
+    @classmethod
+    def open(cls, index_dir: Path, dims: int):
+        """The saved coarse vectors, or None when missing or built with other dimensions"""
+        path = index_dir / 'embeddings_coarse.npy'
+        if not path.exists():
+            return None
+        vectors = _load_array(path)
+        return cls(vectors) if vectors.shape[1] == dims else None
+
+    def score(self, query_embedding: np.ndarray, ids: np.ndarray = None) -> np.ndarray:
+        """Coarse similarity of every chunk, or of the chunks in ids, to the full query embedding"""
+        query = self.truncate(query_embedding, self.dims)
+        return (self.vectors if ids is None else self.vectors[ids]) @ query
+
+
+class ChunkStore:
+    """
+    Read-only view of chunk texts and metadata backed by memory-mapped files
+
+    The searchable text of every document lives in one UTF-8 blob. Each chunk is a
+    byte range into that blob plus the token range it covers in its document, so
+    overlapping chunks share their bytes, token counts are known without running
+    the tokenizer, and a chunk dict is only materialized on access.
+
+    Chunks are grouped into sections, stored the same way: document -> sections
+    (contiguous ids per document) -> chunks (contiguous rows per section).
+    """
+
+    def __init__(self, text_blob: np.ndarray, doc_offsets: np.ndarray, byte_ranges: np.ndarray,
+                 token_ranges: np.ndarray, doc_idx: np.ndarray, chunk_idx: np.ndarray,
+                 documents: List[Dict], section_byte_ranges: np.ndarray, section_token_ranges: np.ndarray,
+                 section_doc_idx: np.ndarray, chunk_section: np.ndarray):
+        self.text_blob = text_blob
+        self.doc_offsets = doc_offsets  # (n_docs + 1,) byte offset of each document in text_blob
+        self.byte_ranges = byte_ranges  # (n_chunks, 2) absolute [start, end) in text_blob
+        self.token_ranges = token_ranges  # (n_chunks, 2) [start, end) in the document's tokens
+        self.doc_idx = doc_idx
+        self.chunk_idx = chunk_idx
+        self.documents = documents
+        self.section_byte_ranges = section_byte_ranges  # (n_sections, 2) absolute, like byte_ranges
+        self.section_token_ranges = section_token_ranges  # (n_sections, 2) in the document's tokens
+        self.section_doc_idx = section_doc_idx
+        self.chunk_section = chunk_section  # Section id of each chunk
+
+    @staticmethod
+    def write(index_dir: Path, chunks: List[Dict], doc_texts: List[str], doc_sections: List[List[tuple]]):
+        """
+        Args:
+            doc_sections: Per document, its sections as (token_start, token_end,
+                byte_start, byte_end) relative to the document; each chunk's
+                'section_idx' indexes its document's list
+        """
+        encoded = [text.encode('utf-8') for text in doc_texts]
+        doc_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=doc_offsets[1:])
+        with open(index_dir / 'doc_text.bin', 'wb') as f:
+            for b in encoded:
+                f.write(b)
+
+        byte_ranges = np.array([(c['byte_start'], c['byte_end']) for c in chunks], dtype=np.int64).reshape(-1, 2)
+        doc_idx = np.array([c['doc_idx'] for c in chunks], dtype=np.int32)
+        byte_ranges += doc_offsets[doc_idx][:, None]
+        _save_array(index_dir / 'doc_offsets.npy', doc_offsets)
+        _save_array(index_dir / 'chunk_byte_ranges.npy', byte_ranges)
+        _save_array(index_dir / 'chunk_token_ranges.npy',
+                    np.array([(c['token_start'], c['token_end']) for c in chunks], dtype=np.int32).reshape(-1, 2))
+        _save_array(index_dir / 'chunk_doc_idx.npy', doc_idx)
+        _save_array(index_dir / 'chunk_idx.npy', np.array([c['chunk_idx'] for c in chunks], dtype=np.int32))
+
+        section_doc_idx = np.array([i for i, spans in enumerate(doc_sections) for _ in spans], dtype=np.int32)
+        sections = np.array([span for spans in doc_sections for span in spans], dtype=np.int64).reshape(-1, 4)
+        first_section = np.zeros(len(doc_sections) + 1, dtype=np.int64)  # Id of each document's first section
+        np.cumsum([len(spans) for spans in doc_sections], out=first_section[1:])
+        _save_array(index_dir / 'section_byte_ranges.npy', sections[:, 2:] + doc_offsets[section_doc_idx][:, None])
+        _save_array(index_dir / 'section_token_ranges.npy', sections[:, :2].astype(np.int32))
+        _save_array(index_dir / 'section_doc_idx.npy', section_doc_idx)
+        _save_array(index_dir / 'chunk_section.npy',
+                    (first_section[doc_idx] + np.array([c['section_idx'] for c in chunks], dtype=np.int64))
+                    .astype(np.int32))
+
+    @classmethod
+    def open(cls, index_dir: Path, documents: List[Dict]) -> 'ChunkStore':
+        doc_offsets = _load_array(index_dir / 'doc_offsets.npy')
+        if doc_offsets[-1] > 0:
+            text_blob = np.memmap(index_dir / 'doc_text.bin', dtype=np.uint8, mode='r')
+        else:
+            text_blob = np.zeros(0, dtype=np.uint8)  # Empty files cannot be mapped
+        return cls(text_blob, doc_offsets, _load_array(index_dir / 'chunk_byte_ranges.npy'),
+                   _load_array(index_dir / 'chunk_token_ranges.npy'),
+                   _load_array(index_dir / 'chunk_doc_idx.npy'), _load_array(index_dir / 'chunk_idx.npy'),
+                   documents, _load_array(index_dir / 'section_byte_ranges.npy'),
+                   _load_array(index_dir / 'section_token_ranges.npy'),
+                   _load_array(index_dir / 'section_doc_idx.npy'), _load_array(index_dir / 'chunk_section.npy'))
+
+    def __len__(self) -> int:
+        return len(self.doc_idx)
+
+    def span_text(self, start: int, end: int) -> str:
+        """Decode bytes [start, end) of the blob; token boundaries may split a character"""
+        return self.text_blob[start:end].tobytes().decode('utf-8', errors='replace')
+
+    def text(self, idx: int) -> str:
+        start, end = self.byte_ranges[idx]
+        return self.span_text(start, end)
+
+    def token_count(self, idx: int) -> int:
+        start, end = self.token_ranges[idx]
+        return int(end - start)
+
+    def __getitem__(self, idx: int) -> Dict:
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        doc_idx = int(self.doc_idx[idx])
+        doc = self.documents[doc_idx]
+        return {
+            'chunk_id': idx,
+            'doc_idx': doc_idx,
+            'chunk_idx': int(self.chunk_idx[idx]),
+            'section_id': int(self.chunk_section[idx]),
+            'text': self.text(idx),
+            'token_count': self.token_count(idx),
+            'metadata': {
+                'filename': doc.get('filename'),
+                'title': doc.get('title'),
+                'doc_type': doc.get('doc_type')
+            }
+        }
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+class TwoTierCache:
+    """
+    In-process LRU with an optional Redis tier behind it
+
+    The LRU answers repeated lookups without any I/O. When a Redis client is
+    attached (the web app shares its rate-limiting connection), misses fall
+    through to Redis so all workers benefit from each other's entries.
+    Subclasses build the keys and may override _encode/_decode to store values
+    that are not strings; the key-based _get_local/_get/_put stay available to
+    subclasses whose public methods take other arguments.
+    """
+
+    label = 'Cache'  # Prefix of warnings about Redis failures
+
+    def __init__(self, max_entries: int, redis_client=None, redis_ttl: int = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.redis = redis_client
+        self.redis_ttl = redis_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    def _encode(self, value) -> str:
+        return value
+
+    def _decode(self, raw):
+        return raw.decode('utf-8') if isinstance(raw, bytes) else raw
+
+    def get_local(self, key: str):
+        """Look up the in-process tier only (never blocks on I/O)"""
+        return self._get_local(key)
+
+    def get(self, key: str):
+        """Look up both tiers; counts a miss when neither has the key"""
+        return self._get(key)
+
+    def put(self, key: str, value):
+        self._put(key, value)
+
+    def _get_local(self, key: str):
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+        return value
+
+    def _get(self, key: str):
+        value = self._get_local(key)
+        if value is not None:
+            return value
+        if self.redis is not None:
+            try:
+                raw = self.redis.get(key)
+            except Exception as e:
+                print(f"Warning: {self.label} Redis lookup failed: {e}")
+                raw = None
+            if raw:
+                value = self._decode(raw)
+                self._put_local(key, value)
+                with self._lock:
+                    self.redis_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _put(self, key: str, value):
+        self._put_local(key, value)
+        if self.redis is not None:
+            try:
+                self.redis.set(key, self._encode(value), ex=self.redis_ttl)
+            except Exception as e:
+                print(f"Warning: {self.label} Redis write failed: {e}")
+
+    def _put_local(self, key: str, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        lookups = self.memory_hits + self.redis_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'memory_hits': self.memory_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.memory_hits + self.redis_hits) / lookups, 3) if lookups else 0.0,
+            'redis': self.redis is not None,
+        }
+
+
+class QueryEmbeddingCache(TwoTierCache):
+    """Cache of query embeddings keyed on normalized query text and embedding model"""
+
+    label = 'Query cache'
+
+    def __init__(self, max_entries: int = 1024, redis_client=None, redis_ttl: int = 7 * 24 * 3600):
+        super().__init__(max_entries, redis_client, redis_ttl)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.lower().split())
+
+    def _key(self, model: str, text: str) -> str:
+        digest = hashlib.sha256(self.normalize(text).encode('utf-8')).hexdigest()
+        return f"qemb:{model}:{digest}"
+
+    def _encode(self, vec: np.ndarray) -> str:
+        # base64 so the value survives clients created with decode_responses=True
+        return base64.b64encode(vec.tobytes()).decode('ascii')
+
+    def _decode(self, raw) -> np.ndarray:
+        return np.frombuffer(base64.b64decode(raw), dtype=np.float32)
+
+    def get_local(self, model: str, text: str):
+        """Look up the in-process tier only (never blocks on I/O)"""
+        return self._get_local(self._key(model, text))
+
+    def get(self, model: str, text: str):
+        """Look up both tiers; counts a miss when neither has the embedding"""
+        return self._get(self._key(model, text))
+
+    def put(self, model: str, text: str, vec: np.ndarray):
+        self._put(self._key(model, text), np.asarray(vec, dtype=np.float32))
+
+
+class SummaryCache(TwoTierCache):
+    """Cache of chunk summaries keyed on chunk content hash and query intent"""
+
+    label = 'Summary cache'
+
+    def __init__(self, max_entries: int = 4096, redis_client=None, redis_ttl: int = 7 * 24 * 3600):
+        super().__init__(max_entries, redis_client, redis_ttl)
+
+    @staticmethod
+    def intent_key(query: str) -> str:
+        """Order- and filler-insensitive key for what a query asks about"""
+        terms = sorted(set(re.findall(r"[a-z0-9]+", query.lower())) - INTENT_STOPWORDS)
+        return hashlib.sha256(" ".join(terms).encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def key(model: str, chunk_hash: bytes, intent: str) -> str:
+        return f"csum:{model}:{chunk_hash.hex()}:{intent}"
+
+
+class SummaryStore:
+    """Precomputed, query-independent chunk summaries stored alongside the index, one per chunk row"""
+
+    def __init__(self, text_blob: np.ndarray, offsets: np.ndarray):
+        self.text_blob = text_blob
+        self.offsets = offsets  # (n_chunks + 1,) byte offsets into text_blob
+
+    @staticmethod
+    def write(index_dir: Path, summaries: List[str]):
+        encoded = [summary.encode('utf-8') for summary in summaries]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        with open(index_dir / 'chunk_summaries.bin', 'wb') as f:
+            for b in encoded:
+                f.write(b)
+        _save_array(index_dir / 'chunk_summary_offsets.npy', offsets)
+
+    @classmethod
+    def open(cls, index_dir: Path):
+        """The stored summaries, or None when the index was built without them"""
+        offsets_file = index_dir / 'chunk_summary_offsets.npy'
+        if not offsets_file.exists():
+            return None
+        offsets = _load_array(offsets_file)
+        if offsets[-1] > 0:
+            text_blob = np.memmap(index_dir / 'chunk_summaries.bin', dtype=np.uint8, mode='r')
+        else:
+            text_blob = np.zeros(0, dtype=np.uint8)
+        return cls(text_blob, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> str:
+        """Summary of chunk idx; empty if summarizing it failed at build time"""
+        return self.text_blob[self.offsets[idx]:self.offsets[idx + 1]].tobytes().decode('utf-8')
+
+
+class SemanticAnswerCache:
+    """
+    Cache of generated answers keyed by question embedding
+
+    A new question is served from the cache when its cosine similarity to a
+    cached question exceeds the threshold, and the entry was produced from the
+    same corpus version, context size and document filter. Entries expire after a TTL and the
+    least recently used entry is evicted when the cache is full. Embeddings are
+    kept in one preallocated matrix so a lookup is a single matrix-vector product.
+    """
+
+    def __init__(self, max_entries: int = 1000, threshold: float = 0.95, ttl_seconds: int = 86400):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._vectors = None  # (max_entries, dim), allocated on first insert
+        self._entries = [None] * max_entries
+        self._last_used = np.full(max_entries, -np.inf)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, query_embedding: np.ndarray, corpus_version: str, context_docs: int, doc_filter=None):
+        """Best cached entry above the similarity threshold, or None"""
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            if self._vectors is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            sims = self._vectors @ query_embedding
+            for slot in np.argsort(sims)[::-1]:
+                if sims[slot] < self.threshold:
+                    break
+                entry = self._entries[slot]
+                if entry is None or now - entry['created_at'] > self.ttl_seconds:
+                    continue
+                if (entry['corpus_version'] != corpus_version or entry['context_docs'] != context_docs
+                        or entry['doc_filter'] != doc_filter):
+                    continue
+                self._last_used[slot] = now
+                self.hits += 1
+                return entry
+            self.misses += 1
+            return None
+
+    def put(self, query_embedding: np.ndarray, corpus_version: str, context_docs: int,
+            answer: str, sources: List[Dict], doc_filter=None):
+        if self.max_entries <= 0 or query_embedding is None:
+            return
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(query_embedding)), dtype=np.float32)
+            now = time.time()
+            # Reuse an empty or expired slot, otherwise evict the least recently used
+            expired = [i for i, e in enumerate(self._entries)
+                       if e is None or now - e['created_at'] > self.ttl_seconds]
+            slot = expired[0] if expired else int(np.argmin(self._last_used))
+            self._vectors[slot] = query_embedding
+            self._entries[slot] = {
+                'answer': answer,
+                'sources': sources,
+                'corpus_version': corpus_version,
+                'context_docs': context_docs,
+                'doc_filter': doc_filter,
+                'created_at': now,
+            }
+            self._last_used[slot] = now
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': sum(e is not None for e in self._entries),
+            'max_entries': self.max_entries,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class RowFilter:
+    """
+    Chunks of the documents selected by a doc_type / filename filter
+
+    Chunks are stored in document order, so a filter is a few contiguous row
+    ranges. Exact scoring multiplies only those slices of the embedding matrix;
+    ids and mask restrict keyword postings and ANN / first-pass candidates.
+    """
+
+    def __init__(self, ranges: List[tuple], n_chunks: int, n_docs: int):
+        self.ranges = ranges
+        self.n_docs = n_docs  # Selected documents that have chunks
+        self.ids = (np.concatenate([np.arange(start, end) for start, end in ranges])
+                    if ranges else np.empty(0, dtype=np.int64))
+        self.mask = np.zeros(n_chunks, dtype=bool)
+        self.mask[self.ids] = True
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class SearchIndex:
+    """
+    One opened version of the on-disk index
+
+    Everything a request reads (chunks, vectors, keyword postings, summaries) is
+    reached through a single SearchIndex. Publishing a newer version is one
+    reference assignment, and a request that captured the old object keeps
+    reading it consistently until it finishes.
+    """
+
+    COMPONENTS = ('chunks', 'chunk_hashes', 'embeddings', 'keyword_index', 'chunk_summaries',
+                  'ann_index', 'first_pass', 'substring_index')
+
+    def __init__(self, path: Path, manifest: Dict, chunks: ChunkStore, chunk_hashes: np.ndarray,
+                 embeddings: np.ndarray, keyword_index: KeywordIndex, chunk_summaries=None,
+                 ann_index=None, first_pass=None, substring_index: SubstringIndex = None):
+        self.path = path
+        self.manifest = manifest
+        self.corpus_version = manifest['corpus_version']
+        self.documents = manifest['documents']
+        self.span_separator_tokens = manifest['span_separator_tokens']
+        self.doc_separator_tokens = manifest['doc_separator_tokens']
+        self.chunks = chunks
+        self.chunk_hashes = chunk_hashes
+        self.embeddings = embeddings
+        self.keyword_index = keyword_index
+        self.chunk_summaries = chunk_summaries
+        self.ann_index = ann_index
+        self.first_pass = first_pass
+        self.substring_index = substring_index
+
+        # Row range of each document's chunks, and the row filters of each doc_type
+        doc_idx = np.asarray(chunks.doc_idx)
+        doc_ids = np.arange(len(self.documents))
+        self.doc_rows = np.stack([np.searchsorted(doc_idx, doc_ids),
+                                  np.searchsorted(doc_idx, doc_ids, side='right')], axis=1)
+        self._row_filters = {}
+        for doc_type in {doc.get('doc_type') for doc in self.documents}:
+            self.row_filter(((doc_type,), ()))
+
+    def row_filter(self, doc_filter) -> RowFilter:
+        """Rows of the documents matching a _doc_filter() value (None: no filter), cached per filter"""
+        if doc_filter is None:
+            return None
+        rows = self._row_filters.get(doc_filter)
+        if rows is None:
+            doc_types, filenames = doc_filter
+            ranges = []
+            n_docs = 0
+            for doc, (start, end) in zip(self.documents, self.doc_rows):
+                if ((doc_types and doc.get('doc_type') not in doc_types)
+                        or (filenames and doc.get('filename') not in filenames) or start == end):
+                    continue
+                n_docs += 1
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1] = (ranges[-1][0], int(end))  # Adjacent documents form one range
+                else:
+                    ranges.append((int(start), int(end)))
+            rows = RowFilter(ranges, len(self.chunks), n_docs)
+            if len(self._row_filters) < 1024:
+                self._row_filters[doc_filter] = rows
+        return rows
+
+
+class QueryBatcher:
+    """
+    Micro-batcher for concurrent queries
+
+    Queries submitted within window_ms of the first queued one (or until max_batch
+    are queued) are handled together. Their cache misses are embedded in a single
+    embeddings call, and the batch is ranked by ZenonQA.rank_chunk_ids (one matrix
+    product on the exact path). While max_in_flight batches are waiting on the API,
+    new queries keep queueing, so batches grow with load.
+    """
+
+    def __init__(self, qa: 'ZenonQA', window_ms: float = 5.0, max_batch: int = 64,
+                 max_in_flight: int = 4, follow_index: bool = False):
+        """
+        Args:
+            follow_index: Switch to the version cache/index points to before each
+                batch (for processes without their own hot-reload watcher)
+        """
+        self.qa = qa
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.follow_index = follow_index
+        self._pending = queue.Queue()
+        self._slots = threading.Semaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, query: str, top_k: int, semantic_weight: float = 0.7, doc_filter=None) -> Future:
+        """
+        Queue a query; the future resolves to (query_embedding, chunk_ids, scores, index),
+        where index is the SearchIndex the chunk ids refer to
+        """
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._collect, daemon=True)
+                    self._thread.start()
+        result = Future()
+        self._pending.put((query, (top_k, semantic_weight, doc_filter), result))
+        return result
+
+    def _collect(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self._pending.get(timeout=timeout) if timeout > 0 else self._pending.get_nowait())
+                except queue.Empty:
+                    break
+
+            # Wait for a free API slot, taking whatever queued up meanwhile
+            self._slots.acquire()
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            self._executor.submit(self._process, batch).add_done_callback(lambda _: self._slots.release())
+
+    def _process(self, batch: List[tuple]):
+        try:
+            if self.follow_index:
+                self.qa.refresh_index()
+            index = self.qa.index
+            query_embeddings = self.qa.embed_queries([item[0] for item in batch])
+
+            groups = defaultdict(list)
+            for row, item in enumerate(batch):
+                groups[item[1]].append(row)
+            for (top_k, semantic_weight, doc_filter), rows in groups.items():
+                ranked = self.qa.rank_chunk_ids([batch[row][0] for row in rows], query_embeddings[rows],
+                                                top_k, semantic_weight, index, doc_filter)
+                for row, (chunk_ids, scores) in zip(rows, ranked):
+                    batch[row][2].set_result((query_embeddings[row], chunk_ids, scores, index))
+        except Exception as e:
+            for item in batch:
+                if not item[2].done():
+                    item[2].set_exception(e)
+
+
+class RetrievalClient:
+    """
+    Client of a RetrievalServer on a Unix socket, shared by all threads of a worker
+
+    Idle connections are pooled; a pooled connection the server has since closed
+    is replaced once before the call fails.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise ConnectionError(f"Retrieval service unreachable at {self.socket_path}: {e}") from e
+        return sock
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytearray:
+        buf = bytearray(size)
+        view = memoryview(buf)
+        received = 0
+        while received < size:
+            n = sock.recv_into(view[received:])
+            if not n:
+                raise ConnectionError("Retrieval service closed the connection")
+            received += n
+        return buf
+
+    def search(self, query: str, top_k: int, semantic_weight: float = 0.7, doc_filter=None):
+        """
+        Embed and rank one query on the retrieval service
+
+        Returns:
+            (corpus_version, query_embedding, chunk_ids, scores)
+        """
+        payload = query.encode('utf-8')
+        filter_payload = json.dumps(doc_filter).encode('utf-8') if doc_filter else b''
+        request = RETRIEVAL_REQUEST.pack(top_k, semantic_weight, len(payload), len(filter_payload)) \
+            + payload + filter_payload
+        with self._lock:
+            sock = self._idle.pop() if self._idle else None
+        pooled = sock is not None
+        while True:
+            if sock is None:
+                sock = self._connect()
+            try:
+                sock.sendall(request)
+                header = self._recv_exact(sock, RETRIEVAL_RESPONSE.size)
+                break
+            except (ConnectionError, OSError):
+                sock.close()
+                if not pooled:
+                    raise
+                sock, pooled = None, False  # Stale pooled connection; retry on a fresh one
+        try:
+            status, corpus_version, n, dim, error_length = RETRIEVAL_RESPONSE.unpack(header)
+            body = self._recv_exact(sock, error_length if status else dim * 4 + n * 8)
+        except Exception:
+            sock.close()
+            raise
+        with self._lock:
+            self._idle.append(sock)
+
+        if status:
+            raise RuntimeError(f"Retrieval service error: {body.decode('utf-8', errors='replace')}")
+        query_embedding = np.frombuffer(body, dtype='<f4', count=dim)
+        chunk_ids = np.frombuffer(body, dtype='<i4', count=n, offset=dim * 4)
+        scores = np.frombuffer(body, dtype='<f4', count=n, offset=dim * 4 + n * 4)
+        return corpus_version.decode('ascii'), query_embedding, chunk_ids, scores
+
+
+class _RetrievalSocketServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 256  # Every worker thread may connect at once (the default backlog is 5)
+
+
+class _RetrievalRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        service = self.server.service
+        while True:
+            header = self.rfile.read(RETRIEVAL_REQUEST.size)
+            if len(header) < RETRIEVAL_REQUEST.size:
+                return  # Client disconnected
+            top_k, semantic_weight, length, filter_length = RETRIEVAL_REQUEST.unpack(header)
+            query = self.rfile.read(length).decode('utf-8', errors='replace')
+            filter_payload = self.rfile.read(filter_length) if filter_length else b''
+            self.wfile.write(service.handle(query, top_k, semantic_weight, filter_payload))
+            self.wfile.flush()
+
+
+class RetrievalServer:
+    """
+    Dedicated retrieval process shared by thin web workers (`zenon_ai.py serve-retrieval`)
+
+    Holds the only query embedding cache and the only mapped copy of the vectors
+    and keyword postings. Each connection is served by its own thread, which hands
+    its query to a QueryBatcher, so concurrent queries from all workers share
+    embeddings calls and matrix products over the embeddings.
+    """
+
+    def __init__(self, qa: 'ZenonQA', socket_path: str):
+        self.qa = qa
+        self.socket_path = socket_path
+        # Follow hot reloads published by the web workers
+        self.batcher = QueryBatcher(qa, qa.query_batch_window_ms, qa.query_batch_max_size,
+                                    qa.embedding_concurrency, follow_index=True)
+
+    def handle(self, query: str, top_k: int, semantic_weight: float, filter_payload: bytes = b'') -> bytes:
+        """Serve one request and return the encoded response; any failure becomes an error frame"""
+        try:
+            doc_filter = _doc_filter(*json.loads(filter_payload)) if filter_payload else None
+            query_embedding, chunk_ids, scores, index = self.batcher.submit(
+                query, top_k, semantic_weight, doc_filter).result()
+        except Exception as e:
+            message = str(e).encode('utf-8')
+            return RETRIEVAL_RESPONSE.pack(1, b'', 0, 0, len(message)) + message
+
+        return b''.join((
+            RETRIEVAL_RESPONSE.pack(0, index.corpus_version.encode('ascii'), len(chunk_ids), len(query_embedding), 0),
+            np.asarray(query_embedding, dtype='<f4').tobytes(),
+            np.asarray(chunk_ids, dtype='<i4').tobytes(),
+            np.asarray(scores, dtype='<f4').tobytes(),
+        ))
+
+    def serve_forever(self):
+        path = Path(self.socket_path)
+        if path.is_socket():
+            path.unlink()  # Left behind by a previous run
+
+        with _RetrievalSocketServer(str(path), _RetrievalRequestHandler) as server:
+            server.service = self
+            print(f"Retrieval service listening on {path} (index {self.qa.corpus_version})")
+            server.serve_forever()
+
+
 class ZenonQA:
-    def __init__(self, context_dir: str = "context", api_key: str = None):
+    def __init__(self, context_dir: str = "context", api_key: str = None, read_only: bool = False,
+                 retrieval_socket: str = None):
         """
         Initialize the Zenon Q&A tool
 
         Args:
             context_dir: Path to directory containing Markdown documentation files
             api_key: OpenAI API key (if not provided, will use OPENAI_API_KEY env var)
+            read_only: Open the index built by `zenon_ai.py build-index` as-is, without
+                reading context_dir or checking it for changes. Raises if there is no
+                usable index.
+            retrieval_socket: Unix socket of a `zenon_ai.py serve-retrieval` process. Queries
+                are then embedded and ranked there, and this instance maps only the
+                chunk text and summaries it needs to build prompts.
         """
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
         if not self.api_key:
             raise ValueError("OpenAI API key must be provided or set in OPENAI_API_KEY environment variable or .env file")
 
-        self.client = OpenAI(api_key=self.api_key)
+        # openai and tiktoken are imported on first use, so a read-only worker that
+        # answers from cached embeddings does not pay for them at startup
+        self._client = None
+        self._async_client = None
+        self._tokenizer = None
+        self.read_only = read_only
+        self.retrieval = RetrievalClient(retrieval_socket) if retrieval_socket else None
         self.context_dir = context_dir
         self.documents = []  # Original documents
         self.chunks = []  # List of chunks with metadata
-        self.embeddings = []
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)  # (n_chunks, dim) matrix
 
         # Ensure cache directory exists
         cache_dir = Path('cache')
         cache_dir.mkdir(exist_ok=True)
 
-        # Cache files stored in cache/ directory
+        # Memory-mapped index shared by all processes, stored in cache/ directory
+        self.index_dir = cache_dir / 'index'
+        self.index_lock_file = cache_dir / 'index.lock'
+        self.embedding_checkpoint_dir = cache_dir / 'embedding_checkpoint'
+
+        # Pickle caches from earlier versions, migrated into the index when present
         self.embeddings_file = cache_dir / 'zenon_embeddings.pkl'
         self.tfidf_file = cache_dir / 'zenon_tfidf.pkl'
         self.chunks_file = cache_dir / 'zenon_chunks.pkl'
@@ -69,29 +1460,112 @@ class ZenonQA:
         self.default_context_docs = int(os.getenv('DEFAULT_CONTEXT_POSTS', '15'))
         self.chunk_size = int(os.getenv('CHUNK_SIZE', '512'))  # Tokens per chunk
         self.chunk_overlap = int(os.getenv('CHUNK_OVERLAP', '50'))
+        # 'sections': chunks follow #/## sections, small ones packed together; 'tokens': fixed windows
+        self.chunk_strategy = os.getenv('CHUNK_STRATEGY', 'sections').lower()
+
+        # Query embedding cache (in-process LRU; web_app attaches its Redis client)
+        self.query_cache = QueryEmbeddingCache(
+            max_entries=int(os.getenv('QUERY_CACHE_SIZE', '1024')),
+            redis_ttl=int(os.getenv('QUERY_CACHE_REDIS_TTL_SECONDS', str(7 * 24 * 3600)))
+        )
+
+        # Semantic answer cache for near-duplicate questions
+        self.answer_cache = SemanticAnswerCache(
+            max_entries=int(os.getenv('ANSWER_CACHE_SIZE', '1000')) if os.getenv('ENABLE_ANSWER_CACHE', 'true').lower() == 'true' else 0,
+            threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95')),
+            ttl_seconds=int(os.getenv('ANSWER_CACHE_TTL_SECONDS', '86400'))
+        )
+
+        # Micro-batching of concurrent queries: QUERY_BATCH_WINDOW_MS > 0 enables it in this
+        # process; the retrieval service always batches (a window of 0 takes what is queued)
+        self.query_batch_window_ms = float(os.getenv('QUERY_BATCH_WINDOW_MS', '0'))
+        self.query_batch_max_size = int(os.getenv('QUERY_BATCH_MAX_SIZE', '64'))
+
+        # Embedding build pipeline
+        self.embedding_concurrency = int(os.getenv('EMBEDDING_CONCURRENCY', '4'))
+        self.embedding_batch_tokens = int(os.getenv('EMBEDDING_BATCH_TOKENS', '100000'))
+        self.embedding_max_retries = int(os.getenv('EMBEDDING_MAX_RETRIES', '6'))
 
         # Compression settings (disabled by default for cost efficiency)
         self.enable_compression = os.getenv('ENABLE_COMPRESSION', 'false').lower() == 'true'
-        self.compression_threshold = int(os.getenv('COMPRESSION_THRESHOLD', '100000'))
-
-        # Diversity reranking
+        self.compression_concurrency = int(os.getenv('COMPRESSION_CONCURRENCY', '8'))
+        self.precompute_summaries = os.getenv('PRECOMPUTE_SUMMARIES', 'false').lower() == 'true'
+        self.summary_cache = SummaryCache(
+            max_entries=int(os.getenv('SUMMARY_CACHE_SIZE', '4096')),
+            redis_ttl=int(os.getenv('SUMMARY_CACHE_REDIS_TTL_SECONDS', str(7 * 24 * 3600)))
+        )
+
+        # Approximate nearest-neighbour search, used once the corpus reaches ANN_MIN_CHUNKS
+        self.ann_index_type = os.getenv('ANN_INDEX', 'ivf').lower()  # 'ivf' or 'none' (always exact)
+        self.ann_min_chunks = int(os.getenv('ANN_MIN_CHUNKS', '20000'))
+        self.ann_nprobe = int(os.getenv('ANN_NPROBE', '32'))
+
+        # Optional first pass on compact vectors, then the best RESCORE_CANDIDATES are
+        # rescored against the full-precision vectors on disk. COARSE_DIMENSIONS > 0
+        # scores truncated vectors; otherwise EMBEDDING_QUANTIZATION=int8 scores int8 codes.
+        # On the ANN / first-pass paths at most RESCORE_CANDIDATES keyword matches are added.
+        self.coarse_dimensions = int(os.getenv('COARSE_DIMENSIONS', '0'))
+        self.embedding_quantization = os.getenv('EMBEDDING_QUANTIZATION', 'none').lower()
+        self.rescore_candidates = int(os.getenv('RESCORE_CANDIDATES', '256'))
+
+        self.query_batcher = None
+        if self.query_batch_window_ms > 0 and self.retrieval is None:
+            self.query_batcher = QueryBatcher(self, self.query_batch_window_ms, self.query_batch_max_size,
+                                              self.embedding_concurrency)
+
+        # Weight of exact phrase / identifier matches (substring index) added to the fused score
+        self.exact_match_weight = float(os.getenv('EXACT_MATCH_WEIGHT', '0.3'))
+
+        # Diversity reranking: at most 3 chunks per document, then Maximal Marginal Relevance
+        # with MMR_LAMBDA (1 = relevance order only)
         self.enable_diversity = os.getenv('ENABLE_DIVERSITY', 'true').lower() == 'true'
+        self.mmr_lambda = float(os.getenv('MMR_LAMBDA', '0.7'))
+        # Chunks retrieved per answer; 0 = twice the context_docs of the request
+        self.context_chunks = int(os.getenv('CONTEXT_CHUNKS', '0'))
 
         # Personality configuration
         self.personality_file = os.getenv('ZENON_PERSONALITY_FILE', 'data/zenon_personality.md')
         self.speculation_threshold = float(os.getenv('SPECULATION_THRESHOLD', '0.5'))
         self.personality_context = self._load_personality()
 
-        # Tokenizer for chunking
-        self.tokenizer = tiktoken.encoding_for_model(self.embedding_model)
-
-        # Load the documents
-        self.load_documents()
+        # Context packing: prompt context never exceeds this many tokens
+        self.context_token_budget = int(os.getenv('CONTEXT_TOKEN_BUDGET', '8000'))
+        # Compression (when enabled) replaces packing once the retrieved chunks total more
+        # than this many tokens; by default, when they would not all fit the budget
+        self.compression_threshold = int(os.getenv('COMPRESSION_THRESHOLD') or self.context_token_budget)
+        # Retrieved chunks are widened to their whole section up to this size; 0 = chunks only
+        self.section_context_max_tokens = int(os.getenv('SECTION_CONTEXT_MAX_TOKENS', '1024'))
 
-        # Load or create chunks, embeddings, and TF-IDF
-        self.load_or_create_chunks()
-        self.load_or_create_embeddings()
-        self.load_or_create_tfidf()
+        if read_only:
+            self.open_index()
+        else:
+            # Load the documents
+            self.load_documents()
+
+            # Load or build the chunk, embedding and TF-IDF index
+            self.load_or_create_index()
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.api_key)
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            self._async_client = AsyncOpenAI(api_key=self.api_key)
+        return self._async_client
+
+    @property
+    def tokenizer(self):
+        """Tokenizer of the embedding model, used only while building the index"""
+        if self._tokenizer is None:
+            import tiktoken
+            self._tokenizer = tiktoken.encoding_for_model(self.embedding_model)
+        return self._tokenizer
     
     def load_documents(self):
         """Load Markdown documents from context directory"""
@@ -133,7 +1607,8 @@ class ZenonQA:
                     'title': title,
                     'content': content,
                     'doc_type': doc_type,
-                    'path': str(md_file)
+                    'path': str(md_file),
+                    'sha256': hashlib.sha256(content.encode('utf-8')).hexdigest()
                 })
             except Exception as e:
                 print(f"Warning: Could not load {md_file}: {e}")
@@ -155,6 +1630,14 @@ class ZenonQA:
             print(f"Note: Personality file not found at {self.personality_file}, using generic mode")
             return ""
 
+    @staticmethod
+    def _context_header(doc: Dict) -> str:
+        """Metadata lines that open a document's searchable text and its block in the context"""
+        return (f"Document: {doc.get('filename', 'Unknown')}\n"
+                f"Title: {doc.get('title', 'Unknown')}\n"
+                f"Type: {doc.get('doc_type', 'research')}\n"
+                f"Content: ")
+
     def _create_searchable_text(self, doc: Dict) -> str:
         """Create a searchable text representation of a document (normalized)"""
         parts = []
@@ -170,106 +1653,658 @@ class ZenonQA:
 
         return "\n".join(parts).strip()
     
-    def load_or_create_chunks(self):
-        """Create or load chunks from documents for granular embeddings"""
-        if os.path.exists(self.chunks_file):
-            print(f"Loading existing chunks from {self.chunks_file}...")
-            with open(self.chunks_file, 'rb') as f:
-                self.chunks = pickle.load(f)
-            print(f"Loaded {len(self.chunks)} chunks")
+    def _index_config(self) -> Dict:
+        """Settings that invalidate the on-disk index when changed"""
+        return {
+            'format_version': INDEX_FORMAT_VERSION,
+            'embedding_model': self.embedding_model,
+            'chunk_size': self.chunk_size,
+            'chunk_overlap': self.chunk_overlap,
+            'chunk_strategy': self.chunk_strategy,
+            'summary_model': self.chat_model if self.precompute_summaries else None,
+        }
+
+    def _corpus_version(self) -> str:
+        """Identifier of the indexed corpus: document hashes plus index settings"""
+        digest = hashlib.sha256(json.dumps(self._index_config(), sort_keys=True).encode('utf-8'))
+        for doc in self.documents:
+            digest.update(f"{doc['filename']}:{doc['sha256']}\n".encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def load_or_create_index(self):
+        """
+        Open the memory-mapped index, updating it first if missing or stale
+
+        The manifest stored with the index records a content hash per document, so
+        edits to context/ are detected at startup and only the affected documents
+        are re-chunked and re-embedded. The update runs under an exclusive file lock
+        so that when several workers start together only one of them does the work;
+        the others wait and then map the finished files.
+        """
+        with open(self.index_lock_file, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                manifest = self._read_manifest()
+                reason = self._stale_reason(manifest)
+                if reason:
+                    print(f"[Index] Index is stale: {reason}")
+                    self.create_index(manifest)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        self.open_index()
+
+    def _read_manifest(self, index_dir: Path = None):
+        manifest_file = (index_dir or self.index_dir) / 'manifest.json'
+        if not manifest_file.exists():
+            return None
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _stale_reason(self, manifest) -> str:
+        """Why the index on disk does not match the current documents, or '' if it does"""
+        if manifest is None:
+            return "no index found"
+
+        changed_settings = [key for key, value in self._index_config().items() if manifest.get(key) != value]
+        if changed_settings:
+            return f"settings changed ({', '.join(changed_settings)})"
+
+        indexed = {doc['filename']: doc.get('sha256') for doc in manifest['documents']}
+        current = {doc['filename']: doc['sha256'] for doc in self.documents}
+        added = sorted(current.keys() - indexed.keys())
+        removed = sorted(indexed.keys() - current.keys())
+        changed = sorted(name for name in current.keys() & indexed.keys() if current[name] != indexed[name])
+        if not (added or removed or changed):
+            if self._wants_ann(manifest['n_chunks']) and IVFIndex.open(self.index_dir) is None:
+                return "ANN index missing"
+            if self.coarse_dimensions > 0:
+                if CoarseEmbeddings.open(self.index_dir, self.coarse_dimensions) is None:
+                    return f"{self.coarse_dimensions}-d coarse embeddings missing"
+            elif self.embedding_quantization == 'int8' and QuantizedEmbeddings.open(self.index_dir) is None:
+                return "quantized embeddings missing"
+            if not (self.index_dir / 'suffix_array.npy').exists():
+                return "substring index missing"
+            return ""
+        for label, names in (('new', added), ('changed', changed), ('removed', removed)):
+            for name in names:
+                print(f"[Index]   {label}: {name}")
+        return f"{len(changed)} changed, {len(added)} new, {len(removed)} removed documents"
+
+    def open_index(self):
+        """
+        Map the index version cache/index points to and publish it to requests
+
+        Files are mapped read-only; no arrays are copied into process memory.
+        """
+        path = self.index_dir.resolve()
+        manifest = self._read_manifest(path)
+        if manifest is None:
+            raise RuntimeError(f"No index found in {self.index_dir}; run 'python zenon_ai.py build-index' first")
+        if manifest.get('format_version') != INDEX_FORMAT_VERSION:
+            raise RuntimeError(f"Index in {path} has format {manifest.get('format_version')}, "
+                               f"expected {INDEX_FORMAT_VERSION}; rebuild it with 'python zenon_ai.py build-index'")
+        for name, size in manifest['files'].items():
+            if not (path / name).exists() or (path / name).stat().st_size != size:
+                raise RuntimeError(f"Index file {path / name} is missing or incomplete; rebuild the index")
+
+        chunks = ChunkStore.open(path, manifest['documents'])
+        if self.retrieval is not None:
+            # Vectors and keyword postings are only read by the retrieval service
+            index = SearchIndex(path, manifest, chunks, chunk_hashes=_load_array(path / 'chunk_hashes.npy'),
+                                embeddings=None, keyword_index=None, chunk_summaries=SummaryStore.open(path))
+            self._use_index(index)
+            return
+        if self.coarse_dimensions > 0:
+            first_pass = CoarseEmbeddings.open(path, self.coarse_dimensions)
+        elif self.embedding_quantization == 'int8':
+            first_pass = QuantizedEmbeddings.open(path)
         else:
-            print("Creating chunks from documents...")
-            self.create_chunks()
-            with open(self.chunks_file, 'wb') as f:
-                pickle.dump(self.chunks, f)
-            print("Chunks saved")
+            first_pass = None
+        index = SearchIndex(
+            path, manifest, chunks,
+            chunk_hashes=_load_array(path / 'chunk_hashes.npy'),
+            embeddings=_load_array(path / 'embeddings.npy'),
+            keyword_index=KeywordIndex.open(path, len(chunks)),
+            chunk_summaries=SummaryStore.open(path),
+            ann_index=IVFIndex.open(path) if self._wants_ann(len(chunks)) else None,
+            first_pass=first_pass,
+            substring_index=SubstringIndex.open(path, chunks),
+        )
+        self._use_index(index)
+
+    def _use_index(self, index: SearchIndex):
+        # Requests already running keep the index they started with
+        self.index = index
+        self.corpus_version = index.corpus_version
+        self.index_documents = index.documents
+        if self.read_only:
+            self.documents = index.documents
+        for name in SearchIndex.COMPONENTS:
+            setattr(self, name, getattr(index, name))  # Also releases the build-time copies
+        print(f"Opened index {self.corpus_version} with {len(self.chunks)} chunks from {index.path}")
+
+    def create_index(self, previous: Dict = None):
+        """
+        Chunk, embed and index all documents, then write the index atomically
+
+        Args:
+            previous: Manifest of the index currently on disk, if any. Chunks and
+                keyword postings of unchanged documents are carried over when the
+                index settings match, and embeddings are reused for every chunk
+                whose content hash is already known.
+        """
+        reuse = previous is not None and all(
+            previous.get(key) == value for key, value in self._index_config().items())
+        old_docs, old_chunks, old_keywords, old_ann = {}, None, None, None
+        if reuse:
+            old_docs = {doc['filename']: (idx, doc) for idx, doc in enumerate(previous['documents'])}
+            old_chunks = ChunkStore.open(self.index_dir, previous['documents'])
+            old_keywords = KeywordIndex.open(self.index_dir, len(old_chunks))
+            old_ann = IVFIndex.open(self.index_dir)
 
-    def create_chunks(self):
-        """Split documents into chunks for better granularity"""
         self.chunks = []
+        self.doc_sections = []
+        kept_rows, new_rows, added = [], [], []
         for doc_idx, doc in enumerate(self.documents):
-            text = self._create_searchable_text(doc)
-            tokens = self.tokenizer.encode(text)
-
-            if len(tokens) <= self.chunk_size:
-                self.chunks.append({
-                    'doc_idx': doc_idx,
-                    'chunk_idx': 0,
-                    'text': text,
-                    'metadata': {
-                        'filename': doc.get('filename'),
-                        'title': doc.get('title'),
-                        'doc_type': doc.get('doc_type')
-                    }
-                })
+            old_idx, old_doc = old_docs.get(doc['filename'], (None, None))
+            if old_doc is not None and old_doc.get('sha256') == doc['sha256']:
+                start, end = np.searchsorted(old_chunks.doc_idx, [old_idx, old_idx + 1])
+                first_section, last_section = np.searchsorted(old_chunks.section_doc_idx, [old_idx, old_idx + 1])
+                doc_start = old_chunks.doc_offsets[old_idx]
+                for row in range(start, end):
+                    kept_rows.append(row)
+                    new_rows.append(len(self.chunks))
+                    self.chunks.append(self._make_chunk(doc_idx, doc, int(old_chunks.chunk_idx[row]),
+                                                        old_chunks.text(row),
+                                                        old_chunks.byte_ranges[row] - doc_start,
+                                                        old_chunks.token_ranges[row],
+                                                        int(old_chunks.chunk_section[row] - first_section)))
+                self.doc_sections.append([
+                    (*(int(x) for x in old_chunks.section_token_ranges[section]),
+                     *(int(x - doc_start) for x in old_chunks.section_byte_ranges[section]))
+                    for section in range(first_section, last_section)])
             else:
-                # Split with overlap
-                chunk_num = 0
-                for start in range(0, len(tokens), self.chunk_size - self.chunk_overlap):
-                    end = start + self.chunk_size
-                    chunk_tokens = tokens[start:end]
-                    chunk_text = self.tokenizer.decode(chunk_tokens)
-                    self.chunks.append({
-                        'doc_idx': doc_idx,
-                        'chunk_idx': chunk_num,
-                        'text': chunk_text,
-                        'metadata': {
-                            'filename': doc.get('filename'),
-                            'title': doc.get('title'),
-                            'doc_type': doc.get('doc_type')
-                        }
-                    })
-                    chunk_num += 1
-                    if end >= len(tokens):
-                        break
-        print(f"Created {len(self.chunks)} chunks from {len(self.documents)} documents")
-    
-    def load_or_create_embeddings(self):
-        """Load existing embeddings or create new ones for chunks"""
-        if os.path.exists(self.embeddings_file):
-            print(f"Loading existing embeddings from {self.embeddings_file}...")
-            with open(self.embeddings_file, 'rb') as f:
-                self.embeddings = pickle.load(f)
-            print(f"Loaded {len(self.embeddings)} embeddings")
+                chunks, sections = self._chunk_document(doc_idx, doc)
+                for chunk in chunks:
+                    added.append((len(self.chunks), chunk['text']))
+                    self.chunks.append(chunk)
+                self.doc_sections.append(sections)
+        print(f"[Index] {len(self.chunks)} chunks: {len(kept_rows)} unchanged, {len(added)} from new or changed documents")
+
+        self.chunk_hashes = [_chunk_hash(chunk['text']) for chunk in self.chunks]
+        self.embeddings = self._embed_chunks(self._reusable_embeddings(previous))
+        self.chunk_summaries = self._summarize_chunks(previous) if self.precompute_summaries else None
+        self.ann_index = self._build_ann_index(old_ann, kept_rows, new_rows, [row for row, _ in added])
+        self.first_pass = self._build_first_pass()
+
+        if reuse:
+            self.keyword_index = old_keywords.update(np.asarray(kept_rows, dtype=np.int64),
+                                                     np.asarray(new_rows, dtype=np.int64),
+                                                     added, len(self.chunks))
         else:
+            print("Creating TF-IDF for hybrid search...")
+            self.create_tfidf()
+        self.save_index()
+
+    def _reusable_embeddings(self, previous: Dict = None) -> Dict[bytes, np.ndarray]:
+        """Map of chunk content hash -> embedding from the previous index or legacy caches"""
+        known = {}
+        if previous is not None and previous.get('embedding_model') == self.embedding_model:
+            embeddings = _load_array(self.index_dir / 'embeddings.npy')
+            hashes_file = self.index_dir / 'chunk_hashes.npy'
+            if hashes_file.exists():
+                hashes = (row.tobytes() for row in _load_array(hashes_file))
+            else:
+                # Format 1 indexes predate stored hashes; derive them from the chunk texts
+                offsets = _load_array(self.index_dir / 'chunk_offsets.npy')
+                blob = (self.index_dir / 'chunk_text.bin').read_bytes()
+                hashes = (_chunk_hash(blob[start:end].decode('utf-8'))
+                          for start, end in zip(offsets[:-1], offsets[1:]))
+            known.update((h, vec) for h, vec in zip(hashes, embeddings) if vec.any())  # Skip failed-batch placeholders
+
+        # Pickle caches from before the memory-mapped index
+        if self.chunks_file.exists() and self.embeddings_file.exists():
+            if self.embedding_model != LEGACY_EMBEDDING_MODEL:
+                print(f"[Index] Skipping legacy embedding cache: it was made with {LEGACY_EMBEDDING_MODEL}, "
+                      f"not {self.embedding_model}")
+                return known
+            with open(self.chunks_file, 'rb') as f:
+                legacy_chunks = pickle.load(f)
+            with open(self.embeddings_file, 'rb') as f:
+                legacy_embeddings = np.asarray(pickle.load(f), dtype=np.float32)
+            if legacy_embeddings.ndim != 2 or legacy_embeddings.shape[1] != LEGACY_EMBEDDING_DIM:
+                print(f"[Index] Skipping legacy embedding cache: shape {legacy_embeddings.shape} does not "
+                      f"match {LEGACY_EMBEDDING_MODEL} ({LEGACY_EMBEDDING_DIM} dimensions)")
+                return known
+            if len(legacy_chunks) == len(legacy_embeddings):
+                for chunk, vec in zip(legacy_chunks, legacy_embeddings):
+                    if vec.any():  # Zero vectors were placeholders for failed batches
+                        known.setdefault(_chunk_hash(chunk['text']), vec)
+        return known
+
+    def _embed_chunks(self, known: Dict[bytes, np.ndarray]) -> np.ndarray:
+        """Embedding matrix for self.chunks, calling the API only for unknown content hashes"""
+        missing = [i for i, h in enumerate(self.chunk_hashes) if h not in known]
+        print(f"[Index] Reusing {len(self.chunk_hashes) - len(missing)} embeddings, "
+              f"embedding {len(missing)} new chunks")
+
+        new_vectors = None
+        if missing:
             print("Creating embeddings for chunks (this may take a while)...")
-            self.create_embeddings()
-            self.save_embeddings()
+            new_vectors = self.create_embeddings([self.chunks[i]['text'] for i in missing])
+
+        if new_vectors is not None:
+            dim = new_vectors.shape[1]
+        elif known:
+            dim = len(next(iter(known.values())))
+        else:
+            dim = 0
+        embeddings = np.empty((len(self.chunks), dim), dtype=np.float32)
+        missing_pos = {idx: pos for pos, idx in enumerate(missing)}
+        for i, h in enumerate(self.chunk_hashes):
+            embeddings[i] = new_vectors[missing_pos[i]] if i in missing_pos else known[h]
+        return embeddings
+
+    def _wants_ann(self, n_chunks: int) -> bool:
+        """Whether semantic search goes through the ANN index; small corpora are searched exactly"""
+        return self.ann_index_type == 'ivf' and n_chunks >= self.ann_min_chunks
+
+    def _build_ann_index(self, previous: IVFIndex, kept_rows: List[int], new_rows: List[int],
+                         added_rows: List[int]):
+        """IVF index over self.embeddings, keeping the previous centroids while the corpus has not doubled"""
+        if not self._wants_ann(len(self.chunks)):
+            return None
+        if (previous is not None and previous.centroids.shape[1] == self.embeddings.shape[1]
+                and len(self.chunks) <= 2 * len(previous.ids)):
+            print(f"[Index] Updating IVF index ({previous.n_lists} lists, {len(added_rows)} new chunks)")
+            return previous.update(kept_rows, new_rows, self.embeddings, added_rows)
+        print(f"[Index] Training IVF index over {len(self.chunks)} chunks...")
+        ann_index = IVFIndex.build(self.embeddings)
+        print(f"[Index] IVF index has {ann_index.n_lists} lists")
+        return ann_index
+
+    def _build_first_pass(self):
+        """Compact vectors for first-pass scoring, as configured"""
+        if self.coarse_dimensions > 0:
+            if self.coarse_dimensions >= self.embeddings.shape[1]:
+                raise ValueError(f"COARSE_DIMENSIONS ({self.coarse_dimensions}) must be below "
+                                 f"the embedding size ({self.embeddings.shape[1]})")
+            return CoarseEmbeddings.build(self.embeddings, self.coarse_dimensions)
+        if self.embedding_quantization == 'int8':
+            return QuantizedEmbeddings.build(self.embeddings)
+        return None
+
+    def _summarize_chunks(self, previous: Dict = None) -> List[str]:
+        """Query-independent summary per chunk, reusing those of the previous index by content hash"""
+        known = {}
+        if previous is not None and previous.get('summary_model') == self.chat_model:
+            store = SummaryStore.open(self.index_dir)
+            if store is not None:
+                hashes = _load_array(self.index_dir / 'chunk_hashes.npy')
+                known = {h.tobytes(): store[row] for row, h in enumerate(hashes) if store[row]}
+
+        missing = [i for i, h in enumerate(self.chunk_hashes) if h not in known]
+        print(f"[Index] Reusing {len(self.chunk_hashes) - len(missing)} summaries, "
+              f"summarizing {len(missing)} chunks")
+        summaries = [known.get(h, "") for h in self.chunk_hashes]
+
+        def summarize(i):
+            try:
+                return self._summarize_text(self.chunks[i]['text'])
+            except Exception as e:
+                print(f"[Warning] Summary failed for chunk {i}, it will be compressed per query: {e}")
+                return ""
+
+        with ThreadPoolExecutor(max_workers=max(1, self.compression_concurrency)) as executor:
+            for i, summary in zip(missing, executor.map(summarize, missing)):
+                summaries[i] = summary
+        return summaries
+
+    def save_index(self):
+        """
+        Write the index as a new version directory and point cache/index at it
+
+        Each version lives in cache/index-<corpus_version>/ and cache/index is a
+        symlink that is replaced atomically, so readers resolve either the old
+        or the new version, never a half-written one. A rebuild of a version that
+        is already on disk (e.g. to add ANN or substring files) gets a new
+        directory name, so the published directory is never modified in place and
+        running workers see the path change.
+        """
+        version_dir = self.index_dir.with_name(f"{self.index_dir.name}-{self._corpus_version()}")
+        if version_dir.exists():
+            version_dir = version_dir.with_name(f"{version_dir.name}.b{time.time_ns()}")
+        tmp_dir = version_dir.with_name(f"{version_dir.name}.tmp-{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+
+        ChunkStore.write(tmp_dir, self.chunks, [self._create_searchable_text(doc) for doc in self.documents],
+                         self.doc_sections)
+        written = ChunkStore.open(tmp_dir, self.documents)
+        self.substring_index = SubstringIndex.build(written.text_blob, written.byte_ranges)
+        self.substring_index.save(tmp_dir)
+        hashes = np.frombuffer(b"".join(self.chunk_hashes), dtype=np.uint8).reshape(len(self.chunk_hashes), 16)
+        _save_array(tmp_dir / 'chunk_hashes.npy', hashes)
+        _save_array(tmp_dir / 'embeddings.npy', self.embeddings.astype(np.float32, copy=False))
+        self.keyword_index.save(tmp_dir)
+        if self.chunk_summaries is not None:
+            SummaryStore.write(tmp_dir, self.chunk_summaries)
+        if self.ann_index is not None:
+            self.ann_index.save(tmp_dir)
+        if self.first_pass is not None:
+            self.first_pass.save(tmp_dir)
+
+        # The manifest describes everything a read-only worker needs, including the
+        # token counts it would otherwise load the tokenizer for
+        manifest = dict(self._index_config())
+        manifest.update({
+            'corpus_version': self._corpus_version(),
+            'created_at': datetime.now().isoformat(),
+            'n_chunks': len(self.chunks),
+            'embedding_dim': int(self.embeddings.shape[1]),
+            'ann_lists': self.ann_index.n_lists if self.ann_index is not None else None,
+            'first_pass': type(self.first_pass).__name__ if self.first_pass is not None else None,
+            'tokenizer': self.tokenizer.name,
+            'span_separator_tokens': len(self.tokenizer.encode(CONTEXT_SPAN_SEPARATOR)),
+            'doc_separator_tokens': len(self.tokenizer.encode(CONTEXT_DOC_SEPARATOR)),
+            'files': {path.name: path.stat().st_size for path in sorted(tmp_dir.iterdir())},
+            'documents': [
+                dict({key: doc.get(key) for key in ('filename', 'title', 'doc_type', 'path', 'sha256')},
+                     header_tokens=len(self.tokenizer.encode(self._context_header(doc))))
+                for doc in self.documents
+            ],
+        })
+        with open(tmp_dir / 'manifest.json', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+        os.replace(tmp_dir, version_dir)
+        self._publish_index(version_dir)
+        print(f"Index {manifest['corpus_version']} saved to {version_dir}")
+
+        # Embeddings are now part of the index, so the build checkpoint is no longer needed
+        shutil.rmtree(self.embedding_checkpoint_dir, ignore_errors=True)
+
+    def _publish_index(self, version_dir: Path):
+        """Atomically repoint cache/index at version_dir and drop versions no worker should still open"""
+        previous = self.index_dir.resolve() if self.index_dir.is_symlink() else None
+        link = self.index_dir.with_name(f"{self.index_dir.name}.link-{os.getpid()}")
+        if link.is_symlink():
+            link.unlink()
+        os.symlink(version_dir.name, link)
+        if self.index_dir.exists() and not self.index_dir.is_symlink():
+            shutil.rmtree(self.index_dir)  # Unversioned directory from before hot reload
+        os.replace(link, self.index_dir)
+
+        # Keep the previous version for workers that have not switched yet; their open
+        # memory maps stay valid even after the files are deleted
+        keep = {version_dir.resolve(), previous}
+        for path in self.index_dir.parent.glob(f"{self.index_dir.name}-*"):
+            if not path.is_dir() or path.resolve() in keep:
+                continue
+            if '.tmp-' in path.name:
+                # Partial build: only remove it once the process writing it is gone
+                pid = path.name.rsplit('.tmp-', 1)[1]
+                if not pid.isdigit() or _pid_alive(int(pid)):
+                    continue
+                print(f"[Index] Removing {path.name} left by an interrupted build")
+            shutil.rmtree(path, ignore_errors=True)
+
+    def refresh_index(self) -> bool:
+        """Switch to the version cache/index points to if it is not the one in use; True if switched"""
+        if self.index_dir.resolve() == self.index.path:
+            return False
+        self.open_index()
+        return True
+
+    def rebuild_index(self) -> bool:
+        """
+        Bring the index up to date with context_dir, then switch to it
+
+        The build runs in a separate ZenonQA instance under the usual index lock,
+        so this one keeps answering from its current index until the new version
+        is published. When the lock is already held (another worker saw the same
+        change and is building), this waits for that build and switches to its
+        result instead of starting another one. Returns True if the index in use
+        changed.
+        """
+        with open(self.index_lock_file, 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                print("[Index] Another process is rebuilding the index, waiting for it")
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                fcntl.flock(lock, fcntl.LOCK_UN)
+                if not self.read_only:
+                    self.load_documents()
+                return self.refresh_index()
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+        builder = ZenonQA(self.context_dir, self.api_key)
+        if not self.read_only:
+            self.documents = builder.documents
+        return self.refresh_index()
+
+    def context_signature(self) -> str:
+        """Cheap fingerprint of context_dir (names, sizes, modification times) for change polling"""
+        digest = hashlib.sha256()
+        for path in sorted(Path(self.context_dir).glob("*.md")):
+            stat = path.stat()
+            digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _make_chunk(self, doc_idx: int, doc: Dict, chunk_idx: int, text: str,
+                    byte_span, token_span, section_idx: int = 0) -> Dict:
+        return {
+            'doc_idx': doc_idx,
+            'chunk_idx': chunk_idx,
+            'section_idx': section_idx,
+            'text': text,
+            'byte_start': int(byte_span[0]),
+            'byte_end': int(byte_span[1]),
+            'token_start': int(token_span[0]),
+            'token_end': int(token_span[1]),
+            'metadata': {
+                'filename': doc.get('filename'),
+                'title': doc.get('title'),
+                'doc_type': doc.get('doc_type')
+            }
+        }
+
+    def _chunk_document(self, doc_idx: int, doc: Dict) -> tuple:
+        """
+        Split one document into sections, and sections into chunks, recording byte and token spans
+
+        With the 'sections' strategy, section boundaries are the document's # and ##
+        headings. Consecutive sections are packed together while they fit in one
+        chunk, so short sections do not become tiny chunks (one under
+        MIN_SECTION_TOKENS joins the next even if that overflows). A longer section is
+        split into token windows with overlap that never cross its boundaries.
+        With 'tokens', the whole document is one section.
+
+        Returns:
+            (chunks, sections) with sections as (token_start, token_end, byte_start,
+            byte_end) tuples; each chunk's 'section_idx' indexes sections
+        """
+        text = self._create_searchable_text(doc)
+        text_bytes = text.encode('utf-8')
+        tokens = self.tokenizer.encode(text)
+
+        if len(tokens) <= self.chunk_size:
+            span = (0, len(text_bytes))
+            return [self._make_chunk(doc_idx, doc, 0, text, span, (0, len(tokens)))], [(0, len(tokens), *span)]
+
+        # Byte offset of every token boundary, so chunks can be addressed in the document text
+        byte_offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in self.tokenizer.decode_tokens_bytes(tokens)], out=byte_offsets[1:])
+
+        bounds = [0, len(tokens)]
+        if self.chunk_strategy == 'sections':
+            # First token of each heading line (the token containing its first byte)
+            heading_tokens = np.searchsorted(byte_offsets, self._heading_offsets(text_bytes), side='right') - 1
+            bounds = sorted({0, len(tokens), *(int(t) for t in heading_tokens if 0 < t < len(tokens))})
+
+        # Pack consecutive heading sections while they fit in one chunk
+        token_sections = []
+        start = end = 0
+        for bound in bounds[1:]:
+            if bound - start > self.chunk_size and end - start >= MIN_SECTION_TOKENS:
+                token_sections.append((start, end))
+                start = end
+            end = bound
+        if token_sections and end - start < MIN_SECTION_TOKENS:
+            start = token_sections.pop()[0]
+        token_sections.append((start, end))
+
+        chunks, sections = [], []
+        for section_start, section_end in token_sections:
+            # Split with overlap inside the section
+            for start in range(section_start, section_end, self.chunk_size - self.chunk_overlap):
+                end = min(start + self.chunk_size, section_end)
+                byte_span = (byte_offsets[start], byte_offsets[end])
+                chunk_text = text_bytes[byte_span[0]:byte_span[1]].decode('utf-8', errors='replace')
+                chunks.append(self._make_chunk(doc_idx, doc, len(chunks), chunk_text, byte_span, (start, end),
+                                               len(sections)))
+                if end >= section_end:
+                    break
+            sections.append((section_start, section_end,
+                             int(byte_offsets[section_start]), int(byte_offsets[section_end])))
+        return chunks, sections
+
+    @staticmethod
+    def _heading_offsets(text_bytes: bytes) -> List[int]:
+        """Byte offsets of the # and ## heading lines, skipping fenced code blocks"""
+        offsets = []
+        position = 0
+        in_fence = False
+        for line in text_bytes.splitlines(keepends=True):
+            stripped = line.lstrip()
+            if stripped.startswith(b'```') or stripped.startswith(b'~~~'):
+                in_fence = not in_fence
+            elif not in_fence and HEADING_PATTERN.match(line):
+                offsets.append(position)
+            position += len(line)
+        return offsets
+
+    def create_chunks(self):
+        """Split documents into chunks for better granularity"""
+        self.chunks = []
+        self.doc_sections = []
+        for doc_idx, doc in enumerate(self.documents):
+            chunks, sections = self._chunk_document(doc_idx, doc)
+            self.chunks.extend(chunks)
+            self.doc_sections.append(sections)
+        print(f"Created {len(self.chunks)} chunks in {sum(map(len, self.doc_sections))} sections "
+              f"from {len(self.documents)} documents")
     
-    def create_embeddings(self):
-        """Create embeddings for all chunks using OpenAI API"""
-        self.embeddings = []
-        batch_size = 100
-        
-        for i in range(0, len(self.chunks), batch_size):
-            batch = self.chunks[i:i+batch_size]
-            texts = [chunk['text'] for chunk in batch]
-            
-            print(f"Processing batch {i//batch_size + 1}/{(len(self.chunks)-1)//batch_size + 1}...")
-            
+    def create_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Create normalized embeddings for chunk texts using OpenAI API
+
+        Texts are packed into batches by token count and sent concurrently, with
+        retries and backoff on rate limits and transient errors. Every finished
+        batch is checkpointed to disk, so an interrupted build resumes by only
+        embedding what is still missing. Raises if a batch keeps failing.
+        """
+        hashes = [_chunk_hash(text) for text in texts]
+        done = self._load_embedding_checkpoint(set(hashes))
+        pending = [i for i, h in enumerate(hashes) if h not in done]
+        if done:
+            print(f"Resuming from checkpoint: {len(texts) - len(pending)}/{len(texts)} embeddings already done")
+
+        batches = self._token_batches([texts[i] for i in pending])
+        print(f"Embedding {len(pending)} chunks in {len(batches)} batches "
+              f"(concurrency {self.embedding_concurrency})...")
+
+        def run_batch(batch):
+            indices = [pending[j] for j in batch]
+            vectors = self._embed_batch([texts[i] for i in indices])
+            self._save_embedding_checkpoint([hashes[i] for i in indices], vectors)
+            return indices, vectors
+
+        with ThreadPoolExecutor(max_workers=self.embedding_concurrency) as executor:
+            futures = [executor.submit(run_batch, batch) for batch in batches]
+            for completed, future in enumerate(as_completed(futures), start=1):
+                indices, vectors = future.result()  # Re-raises once retries are exhausted
+                done.update(zip((hashes[i] for i in indices), vectors))
+                print(f"Processed batch {completed}/{len(batches)}...")
+
+        # Contiguous (n_chunks, dim) float32 matrix, rows normalized for cosine similarity
+        embeddings = np.ascontiguousarray(np.vstack([done[h] for h in hashes]), dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        embeddings /= norms
+
+        print(f"Created {len(embeddings)} embeddings")
+        return embeddings
+
+    def _token_batches(self, texts: List[str]) -> List[List[int]]:
+        """Group text positions into batches bounded by token count and input count"""
+        batches, current, current_tokens = [], [], 0
+        for i, n_tokens in enumerate(len(tokens) for tokens in self.tokenizer.encode_batch(texts)):
+            if current and (current_tokens + n_tokens > self.embedding_batch_tokens or
+                            len(current) >= EMBEDDING_MAX_BATCH_INPUTS):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += n_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed one batch, retrying rate limits and transient API errors with backoff"""
+        from openai import RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+
+        for attempt in range(self.embedding_max_retries + 1):
             try:
                 response = self.client.embeddings.create(
                     model=self.embedding_model,
                     input=texts
                 )
-                for embedding in response.data:
-                    vec = np.array(embedding.embedding)
-                    vec /= np.linalg.norm(vec) if np.linalg.norm(vec) > 0 else 1  # Normalize
-                    self.embeddings.append(vec)
+                return np.asarray([embedding.embedding for embedding in response.data], dtype=np.float32)
+            except (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError) as e:
+                if attempt == self.embedding_max_retries:
+                    raise RuntimeError(f"Embedding batch failed after {attempt + 1} attempts: {e}") from e
+                delay = min(60.0, 2 ** attempt) * (0.5 + random.random())
+                retry_after = getattr(getattr(e, 'response', None), 'headers', {}).get('retry-after')
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                print(f"[Embeddings] {type(e).__name__}, retrying in {delay:.1f}s "
+                      f"(attempt {attempt + 1}/{self.embedding_max_retries})")
+                time.sleep(delay)
+
+    def _model_checkpoint_dir(self) -> Path:
+        """Checkpoint directory of the current EMBEDDING_MODEL, so a model change never resumes old vectors"""
+        return self.embedding_checkpoint_dir / re.sub(r'[^\w.-]', '_', self.embedding_model)
+
+    def _load_embedding_checkpoint(self, wanted: set) -> Dict[bytes, np.ndarray]:
+        """Embeddings saved by an earlier, interrupted build with the same model"""
+        done = {}
+        checkpoint_dir = self._model_checkpoint_dir()
+        if not checkpoint_dir.exists():
+            return done
+        for path in checkpoint_dir.glob('*.npz'):
+            try:
+                with np.load(path) as batch:
+                    for h, vec in zip(batch['hashes'], batch['vectors']):
+                        if h.tobytes() in wanted:
+                            done[h.tobytes()] = vec
             except Exception as e:
-                print(f"Error creating embeddings: {e}")
-                for _ in batch:
-                    self.embeddings.append(np.zeros(3072))  # Size for text-embedding-3-large
-        
-        print(f"Created {len(self.embeddings)} embeddings")
+                print(f"Warning: Ignoring unreadable checkpoint {path}: {e}")
+        return done
+
+    def _save_embedding_checkpoint(self, hashes: List[bytes], vectors: np.ndarray):
+        checkpoint_dir = self._model_checkpoint_dir()
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        name = hashlib.blake2b(b"".join(hashes), digest_size=16).hexdigest()
+        tmp_path = checkpoint_dir / f"{name}.tmp.npz"
+        hash_array = np.frombuffer(b"".join(hashes), dtype=np.uint8).reshape(len(hashes), 16)
+        np.savez(tmp_path, hashes=hash_array, vectors=vectors)
+        os.replace(tmp_path, checkpoint_dir / f"{name}.npz")
     
-    def save_embeddings(self):
-        """Save embeddings to file"""
-        print(f"Saving embeddings to {self.embeddings_file}...")
-        with open(self.embeddings_file, 'wb') as f:
-            pickle.dump(self.embeddings, f)
-        print("Embeddings saved")
-
     def track_cost(self, input_tokens: int, output_tokens: int, model: str):
         """Track API costs"""
         if not self.enable_cost_tracking:
@@ -290,209 +2325,606 @@ class ZenonQA:
             if self.enable_cost_tracking:
                 print(f"[Cost] {model}: ${cost:.4f} (Total: ${self.total_cost:.4f})")
     
-    def load_or_create_tfidf(self):
-        """Load or create TF-IDF vectors for keyword search"""
-        if os.path.exists(self.tfidf_file):
-            print(f"Loading TF-IDF from {self.tfidf_file}...")
-            with open(self.tfidf_file, 'rb') as f:
-                self.term_to_id, self.idf, self.chunk_tfs = pickle.load(f)
-            print("Loaded TF-IDF")
-        else:
-            print("Creating TF-IDF for hybrid search...")
-            self.create_tfidf()
-            with open(self.tfidf_file, 'wb') as f:
-                pickle.dump((self.term_to_id, self.idf, self.chunk_tfs), f)
-            print("TF-IDF saved")
-    
+    def track_usage(self, usage, model: str):
+        """Track API costs from the token usage reported with a response"""
+        if usage is None:
+            return
+        self.track_cost(usage.prompt_tokens, getattr(usage, 'completion_tokens', 0) or 0, model)
+
     def create_tfidf(self):
-        """Simple TF-IDF implementation using numpy"""
-        # Build vocabulary
-        all_terms = set()
-        for chunk in self.chunks:
-            terms = chunk['text'].lower().split()  # Simple tokenization
-            all_terms.update(terms)
-        self.term_to_id = {term: idx for idx, term in enumerate(sorted(all_terms))}
-        vocab_size = len(self.term_to_id)
-        
-        # Document frequency
-        df = np.zeros(vocab_size)
-        for chunk in self.chunks:
-            terms = set(chunk['text'].lower().split())
-            for term in terms:
-                df[self.term_to_id[term]] += 1
-        
-        # IDF
-        self.idf = np.log(len(self.chunks) / (df + 1))  # Smoothing
-        
-        # TF per chunk
-        self.chunk_tfs = []
-        for chunk in self.chunks:
-            tf = np.zeros(vocab_size)
-            terms = chunk['text'].lower().split()
-            for term in terms:
-                tid = self.term_to_id.get(term)
-                if tid is not None:
-                    tf[tid] += 1
-            tf = tf / (len(terms) + 1)  # Normalized TF
-            self.chunk_tfs.append(tf)
+        """Build the sparse TF-IDF keyword index over all chunks"""
+        self.keyword_index = KeywordIndex.build(chunk['text'] for chunk in self.chunks)
+        print(f"Indexed {self.keyword_index.n_terms} terms, "
+              f"{len(self.keyword_index.chunk_ids)} postings")
     
-    def compute_tfidf_scores(self, query_terms: List[str]) -> List[float]:
-        """Compute TF-IDF scores for a query"""
-        query_tf = np.zeros(len(self.term_to_id))
-        for term in query_terms:
-            tid = self.term_to_id.get(term)
-            if tid is not None:
-                query_tf[tid] += 1
-        query_tf /= len(query_terms) + 1
-        
-        scores = []
-        for chunk_tf in self.chunk_tfs:
-            score = np.dot(query_tf * self.idf, chunk_tf * self.idf)
-            scores.append(score)
-        return scores
-    
-    def find_relevant_chunks(self, query: str, top_k: int = 30, semantic_weight: float = 0.7) -> List[Dict]:
+    def find_relevant_chunks(self, query: str, top_k: int = 30, semantic_weight: float = 0.7,
+                             doc_types: List[str] = None, filenames: List[str] = None) -> List[Dict]:
         """
         Hybrid search: semantic + keyword
         Returns top chunks after fusion and optional diversity re-ranking
+
+        doc_types / filenames restrict the search to matching documents; the
+        filter is applied before scoring, so top_k results come from them alone.
         """
-        # Query embedding
+        doc_filter = _doc_filter(doc_types, filenames)
         try:
-            response = self.client.embeddings.create(
-                model=self.embedding_model,
-                input=[query.lower()]  # Normalize
-            )
-            query_embedding = np.array(response.data[0].embedding)
-            query_embedding /= np.linalg.norm(query_embedding)
+            query_embedding, relevant_chunks, index = self._retrieve(
+                query, top_k, self.index, semantic_weight, doc_filter)
+        except Exception as e:
+            print(f"Error retrieving context: {e}")
+            return []
+
+        if relevant_chunks is None:
+            relevant_chunks = self.rank_chunks(query, query_embedding, top_k, semantic_weight, index, doc_filter)
+        return relevant_chunks
+
+    async def find_relevant_chunks_async(self, query: str, top_k: int = 30, semantic_weight: float = 0.7,
+                                         doc_types: List[str] = None, filenames: List[str] = None) -> List[Dict]:
+        """
+        Async variant of find_relevant_chunks
 
-            # Track cost
-            query_tokens = len(self.tokenizer.encode(query))
-            self.track_cost(query_tokens, 0, self.embedding_model)
+        The embedding request is awaited on the event loop; scoring runs in the
+        default executor so other requests keep being served meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        doc_filter = _doc_filter(doc_types, filenames)
+        try:
+            query_embedding, relevant_chunks, index = await self._retrieve_async(
+                query, top_k, self.index, semantic_weight, doc_filter)
         except Exception as e:
-            print(f"Error creating query embedding: {e}")
+            print(f"Error retrieving context: {e}")
             return []
 
-        # Semantic similarities
-        semantic_sim = []
-        for emb in self.embeddings:
-            sim = np.dot(query_embedding, emb)
-            semantic_sim.append(sim)
+        if relevant_chunks is None:
+            relevant_chunks = await loop.run_in_executor(
+                None, self.rank_chunks, query, query_embedding, top_k, semantic_weight, index, doc_filter)
+        return relevant_chunks
+
+    def ranking_signature(self) -> str:
+        """
+        Short hash of the retrieval settings missing from corpus_version, for HTTP cache validators
+
+        Covers everything that changes which chunks come back or in what order:
+        fusion weights, diversity re-ranking, and the ANN / first-pass settings
+        that pick the candidates to rescore (the corpus version only covers the
+        documents and chunking).
+        """
+        config = {
+            'enable_diversity': self.enable_diversity,
+            'mmr_lambda': self.mmr_lambda,
+            'exact_match_weight': self.exact_match_weight,
+            'ann_index_type': self.ann_index_type,
+            'ann_min_chunks': self.ann_min_chunks,
+            'ann_nprobe': self.ann_nprobe,
+            'coarse_dimensions': self.coarse_dimensions,
+            'embedding_quantization': self.embedding_quantization,
+            'rescore_candidates': self.rescore_candidates,
+            'section_context_max_tokens': self.section_context_max_tokens,
+        }
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:8]
 
-        # Keyword scores (TF-IDF)
-        query_terms = query.lower().split()
-        tfidf_scores = self.compute_tfidf_scores(query_terms)
+    async def search_async(self, query: str, limit: int = 10, doc_types: List[str] = None,
+                           filenames: List[str] = None):
+        """
+        Retrieval only: the best chunks for a query, without calling the chat model
 
-        # Fuse scores
-        fused_scores = []
-        for i in range(len(self.chunks)):
-            score = semantic_weight * semantic_sim[i] + (1 - semantic_weight) * tfidf_scores[i]
-            fused_scores.append((i, score))
+        Returns:
+            (corpus_version, results) where each result has the chunk's filename,
+            title, doc_type, chunk_id, score and a snippet around the first query term
+        """
+        loop = asyncio.get_running_loop()
+        doc_filter = _doc_filter(doc_types, filenames)
+        query_embedding, relevant_chunks, index = await self._retrieve_async(
+            query, limit, self.index, doc_filter=doc_filter)
+        if relevant_chunks is None:
+            relevant_chunks = await loop.run_in_executor(
+                None, lambda: self.rank_chunks(query, query_embedding, limit, index=index, doc_filter=doc_filter))
+
+        results = []
+        for chunk in relevant_chunks:
+            results.append({
+                **chunk['metadata'],
+                'chunk_id': chunk['chunk_id'],
+                'score': round(chunk['relevance_score'], 4),
+                'snippet': self._snippet(chunk['text'], query),
+            })
+        return index.corpus_version, results
+
+    @staticmethod
+    def _snippet(text: str, query: str, width: int = 240) -> str:
+        """About width characters of text around the first query term it contains"""
+        if text.startswith("Document: ") and "\nContent: " in text:
+            text = text.split("\nContent: ", 1)[1]  # Drop the metadata header of a document's first chunk
+        text = " ".join(text.split())
+        if len(text) <= width:
+            return text
+
+        lowered = text.lower()
+        positions = [lowered.find(term) for term in query.lower().split() if len(term) > 2]
+        positions = [pos for pos in positions if pos >= 0]
+        start = max(0, min(positions) - width // 3) if positions else 0
+        if start > 0 and text.find(" ", start) >= 0:
+            start = text.find(" ", start) + 1  # Begin and end on word boundaries
+        end = min(len(text), start + width)
+        cut = text.rfind(" ", start, end)
+        if end < len(text) and cut > start:
+            end = cut
+        return ("…" if start > 0 else "") + text[start:end] + ("…" if end < len(text) else "")
+
+    def _retrieve(self, query: str, top_k: int, index: SearchIndex, semantic_weight: float = 0.7,
+                  doc_filter=None):
+        """
+        Embed a query, ranking it right away when that shares work with other queries
 
-        # Sort and get top_k
-        fused_scores.sort(key=lambda x: x[1], reverse=True)
+        With a retrieval service or the query batcher, ranking happens in the same
+        round trip or batch as the embedding. Otherwise only the embedding is made,
+        and callers rank after checking the answer cache.
 
-        # Diversity re-ranking if enabled
-        if self.enable_diversity:
-            relevant_chunks = self._diversity_rerank(fused_scores, top_k)
-        else:
-            top_indices = [idx for idx, _ in fused_scores[:top_k]]
-            relevant_chunks = []
-            for idx in top_indices:
-                chunk = self.chunks[idx].copy()
-                chunk['relevance_score'] = dict(fused_scores)[idx]
-                relevant_chunks.append(chunk)
+        Returns:
+            (query_embedding, relevant_chunks or None, index), where index is the
+            snapshot the chunks come from
+        """
+        if self.retrieval is not None:
+            return self._remote_rank(query, top_k, index, semantic_weight, doc_filter)
+        if self.query_batcher is not None:
+            query_embedding, chunk_ids, scores, index = self.query_batcher.submit(
+                query, top_k, semantic_weight, doc_filter).result()
+            return query_embedding, self._chunks_by_id(index, chunk_ids, scores), index
+        return self.embed_query(query), None, index
+
+    async def _retrieve_async(self, query: str, top_k: int, index: SearchIndex, semantic_weight: float = 0.7,
+                              doc_filter=None):
+        """Async variant of _retrieve"""
+        loop = asyncio.get_running_loop()
+        if self.retrieval is not None:
+            return await loop.run_in_executor(
+                None, self._remote_rank, query, top_k, index, semantic_weight, doc_filter)
+        if self.query_batcher is not None:
+            query_embedding, chunk_ids, scores, index = await asyncio.wrap_future(
+                self.query_batcher.submit(query, top_k, semantic_weight, doc_filter))
+            return query_embedding, self._chunks_by_id(index, chunk_ids, scores), index
+        return await self.embed_query_async(query), None, index
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Normalized query embedding, served from the query cache when possible"""
+        cached = self.query_cache.get(self.embedding_model, query)
+        if cached is not None:
+            return cached
+
+        response = self.client.embeddings.create(
+            model=self.embedding_model,
+            input=[QueryEmbeddingCache.normalize(query)]
+        )
+        return self._query_embedding_from_response(query, response)
+
+    async def embed_query_async(self, query: str) -> np.ndarray:
+        """Async variant of embed_query; Redis lookups run in the default executor"""
+        loop = asyncio.get_running_loop()
+        cached = self.query_cache.get_local(self.embedding_model, query)
+        if cached is None:
+            cached = await loop.run_in_executor(None, self.query_cache.get, self.embedding_model, query)
+        if cached is not None:
+            return cached
+
+        response = await self.async_client.embeddings.create(
+            model=self.embedding_model,
+            input=[QueryEmbeddingCache.normalize(query)]
+        )
+        return await loop.run_in_executor(None, self._query_embedding_from_response, query, response)
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Normalized embeddings of several queries as a (n_queries, dim) matrix
 
+        Cached queries are served from the query cache; the rest (deduplicated
+        after normalization) are embedded in one API call per
+        EMBEDDING_MAX_BATCH_INPUTS queries.
+        """
+        vectors = [self.query_cache.get(self.embedding_model, query) for query in queries]
+        missing = defaultdict(list)
+        for i, vec in enumerate(vectors):
+            if vec is None:
+                missing[QueryEmbeddingCache.normalize(queries[i])].append(i)
+
+        texts = list(missing)
+        for start in range(0, len(texts), EMBEDDING_MAX_BATCH_INPUTS):
+            batch = texts[start:start + EMBEDDING_MAX_BATCH_INPUTS]
+            response = self.client.embeddings.create(model=self.embedding_model, input=batch)
+            for item in response.data:
+                vec = np.asarray(item.embedding, dtype=np.float32)
+                vec /= np.linalg.norm(vec)
+                self.query_cache.put(self.embedding_model, batch[item.index], vec)
+                for i in missing[batch[item.index]]:
+                    vectors[i] = vec
+            self.track_usage(response.usage, self.embedding_model)
+
+        return np.stack(vectors)
+
+    def _query_embedding_from_response(self, query: str, response) -> np.ndarray:
+        query_embedding = np.asarray(response.data[0].embedding, dtype=np.float32)
+        query_embedding /= np.linalg.norm(query_embedding)
+        self.query_cache.put(self.embedding_model, query, query_embedding)
+
+        self.track_usage(response.usage, self.embedding_model)
+        return query_embedding
+
+    def _remote_rank(self, query: str, top_k: int, index: SearchIndex, semantic_weight: float = 0.7,
+                     doc_filter=None):
+        """
+        Embed and rank a query on the retrieval service
+
+        Returns:
+            (query_embedding, relevant_chunks, index), where index is the snapshot the
+            chunk ids refer to (the newer one, if the service already switched to it)
+        """
+        corpus_version, query_embedding, chunk_ids, scores = self.retrieval.search(
+            query, top_k, semantic_weight, doc_filter)
+        if corpus_version != index.corpus_version:
+            self.refresh_index()
+            index = self.index
+            if corpus_version != index.corpus_version:
+                raise RuntimeError(f"Retrieval service ranked index {corpus_version}, "
+                                   f"but this worker has {index.corpus_version}")
+        return query_embedding, self._chunks_by_id(index, chunk_ids, scores), index
+
+    def rank_chunks(self, query: str, query_embedding: np.ndarray, top_k: int = 30,
+                    semantic_weight: float = 0.7, index: SearchIndex = None, doc_filter=None) -> List[Dict]:
+        """Score chunks of index (default: the current one) against an embedded query (CPU only, no API calls)"""
+        index = index or self.index
+        (chunk_ids, scores), = self.rank_chunk_ids([query], query_embedding[None, :], top_k, semantic_weight,
+                                                   index, doc_filter)
+        return self._chunks_by_id(index, chunk_ids, scores)
+
+    def rank_chunk_ids(self, queries: List[str], query_embeddings: np.ndarray, top_k: int = 30,
+                       semantic_weight: float = 0.7, index: SearchIndex = None, doc_filter=None) -> List[tuple]:
+        """
+        Rank chunks for a batch of embedded queries (CPU only, no API calls)
+
+        On the exact path the semantic scores of the whole batch come from one
+        (n_chunks, dim) x (dim, n_queries) product, so the embedding matrix is read
+        once per batch instead of once per query. With a doc_filter (see
+        _doc_filter) only the filtered documents' row ranges are multiplied, and
+        keyword postings of other chunks are dropped before accumulation.
+
+        Returns:
+            One (chunk_ids, scores) pair per query, best first
+        """
+        index = index or self.index
+        rows = index.row_filter(doc_filter)
+        if rows is not None and not len(rows):
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in queries]
+        exact = not self._use_ann(index, rows) and index.first_pass is None
+        block = 256  # Queries per product, bounding the (n_chunks, block) score matrix
+
+        ranked = []
+        for i, query in enumerate(queries):
+            terms = query.lower().split()
+            exact_ids, exact_scores = self._exact_scores(index, query, rows)
+            if exact:
+                keyword_ids, keyword_scores = index.keyword_index.score(terms, None if rows is None else rows.mask)
+                if i % block == 0:
+                    block_embeddings = query_embeddings[i:i + block].T
+                    if rows is None:
+                        block_sims = index.embeddings @ block_embeddings
+                    else:
+                        block_sims = np.concatenate([index.embeddings[start:end] @ block_embeddings
+                                                     for start, end in rows.ranges])
+                candidate_ids = None if rows is None else rows.ids
+                semantic_sim = block_sims[:, i % block]
+            else:
+                # Only the best keyword and exact matches join the semantic candidates: common
+                # words occur in nearly every chunk, and adding all of their hits would rescore
+                # almost the whole matrix. The other candidates still get their keyword scores.
+                keyword_ids, _ = index.keyword_index.top_k(terms, self.rescore_candidates,
+                                                           None if rows is None else rows.mask)
+                best_exact = exact_ids[_top_k_indices(exact_scores, self.rescore_candidates)]
+                candidate_ids, semantic_sim = self._semantic_scores(
+                    index, query_embeddings[i], np.union1d(keyword_ids, best_exact), rows)
+                keyword_ids = candidate_ids
+                keyword_scores = index.keyword_index.score_ids(terms, candidate_ids)
+                in_candidates = np.isin(exact_ids, candidate_ids, assume_unique=True)
+                exact_ids, exact_scores = exact_ids[in_candidates], exact_scores[in_candidates]
+
+            # Fuse with keyword scores (TF-IDF); only chunks containing a query term score above zero.
+            # Chunks containing the query's literal phrases / identifiers get a further boost.
+            fused_scores = semantic_weight * semantic_sim
+            if candidate_ids is None:
+                fused_scores[keyword_ids] += (1 - semantic_weight) * keyword_scores
+                fused_scores[exact_ids] += self.exact_match_weight * exact_scores
+            else:
+                fused_scores[np.searchsorted(candidate_ids, keyword_ids)] += (1 - semantic_weight) * keyword_scores
+                fused_scores[np.searchsorted(candidate_ids, exact_ids)] += self.exact_match_weight * exact_scores
+
+            # Diversity re-ranking if enabled
+            if self.enable_diversity:
+                ranked.append(self._diversity_rerank(index, fused_scores, top_k, candidate_ids, rows))
+                continue
+            top = _top_k_indices(fused_scores, top_k)
+            ranked.append((top if candidate_ids is None else candidate_ids[top], fused_scores[top]))
+
+        return ranked
+
+    @staticmethod
+    def _chunks_by_id(index: SearchIndex, chunk_ids: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        relevant_chunks = []
+        for idx, score in zip(chunk_ids, scores):
+            chunk = index.chunks[int(idx)]
+            chunk['relevance_score'] = float(score)
+            relevant_chunks.append(chunk)
         return relevant_chunks
 
-    def _diversity_rerank(self, scored_chunks: List[tuple], top_k: int) -> List[Dict]:
+    def _exact_scores(self, index: SearchIndex, query: str, rows: RowFilter = None):
+        """Substring index matches of the query's literal terms (see _exact_terms), as (chunk_ids, scores)"""
+        patterns = _exact_terms(query)
+        if index.substring_index is None or not patterns or self.exact_match_weight <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return index.substring_index.score(patterns, None if rows is None else rows.mask)
+
+    def _use_ann(self, index: SearchIndex, rows: RowFilter = None) -> bool:
+        # A filter small enough for exact search skips the ANN index, whose probed
+        # lists could otherwise contain few chunks of the filtered documents
+        return index.ann_index is not None and (rows is None or len(rows) >= self.ann_min_chunks)
+
+    def _semantic_scores(self, index: SearchIndex, query_embedding: np.ndarray, keyword_ids: np.ndarray,
+                         rows: RowFilter = None):
+        """
+        Exact cosine similarities for the chunks worth scoring
+
+        Without an ANN index or first pass this is one matmul over the whole
+        (n_chunks, dim) matrix. Otherwise candidates come from the probed IVF
+        lists and/or the best RESCORE_CANDIDATES first-pass scores (coarse or
+        int8 vectors), the given keyword hits are added, and only those rows of
+        the full-precision matrix are read. rows restricts the candidates to a filter.
+
+        Returns:
+            (candidate_ids, similarities): sorted chunk ids and their scores, or
+            (None, similarities of all chunks)
+        """
+        candidate_ids = None
+        if self._use_ann(index, rows):
+            candidate_ids = index.ann_index.search(query_embedding, self.ann_nprobe)
+            if rows is not None:
+                candidate_ids = candidate_ids[rows.mask[candidate_ids]]
+        elif rows is not None:
+            candidate_ids = rows.ids
+        if index.first_pass is not None:
+            approx = index.first_pass.score(query_embedding, candidate_ids)
+            shortlist = _top_k_indices(approx, self.rescore_candidates)
+            candidate_ids = shortlist if candidate_ids is None else candidate_ids[shortlist]
+
+        if candidate_ids is None:
+            return None, index.embeddings @ query_embedding
+        candidate_ids = np.union1d(candidate_ids, keyword_ids)
+        return candidate_ids, index.embeddings[candidate_ids] @ query_embedding
+
+    def _answer_top_k(self, context_docs: int) -> int:
+        """Chunks to retrieve for an answer: CONTEXT_CHUNKS, or twice context_docs (oversampled)"""
+        return self.context_chunks or context_docs * 2
+
+    def _diversity_rerank(self, index: SearchIndex, fused_scores: np.ndarray, top_k: int,
+                          candidate_ids: np.ndarray = None, rows: RowFilter = None) -> tuple:
         """
         Re-rank chunks to promote diversity (avoid too many chunks from same document)
+
+        fused_scores covers all chunks, or only candidate_ids when those are given.
+        Returns (chunk_ids, scores) of the selected chunks, in selection order.
         """
-        selected = []
-        doc_counts = defaultdict(int)
         max_per_doc = 3  # Maximum chunks from same document
+        if rows is not None and rows.n_docs * max_per_doc < top_k:
+            max_per_doc = top_k  # The filter selects too few documents to fill top_k under the cap
 
-        for idx, score in scored_chunks:
-            doc_idx = self.chunks[idx]['doc_idx']
+        # Only the best-scoring slice needs ordering; widen it if the per-document
+        # cap skips so many chunks that the slice runs out before top_k is reached
+        pool_size = min(len(fused_scores), max(top_k * max_per_doc, 64))
+        while True:
+            pool = _top_k_indices(fused_scores, pool_size)
+            pool_ids = pool if candidate_ids is None else candidate_ids[pool]
+            if self.mmr_lambda < 1:
+                selected = self._mmr_select(index, pool_ids, fused_scores[pool], top_k, max_per_doc)
+            else:
+                selected = []
+                doc_counts = defaultdict(int)
+                for i, doc_idx in enumerate(index.chunks.doc_idx[pool_ids]):
+                    # Skip if we already have too many from this document
+                    if doc_counts[doc_idx] >= max_per_doc:
+                        continue
+                    selected.append(i)
+                    doc_counts[doc_idx] += 1
+                    if len(selected) >= top_k:
+                        break
 
-            # Skip if we already have too many from this document
-            if doc_counts[doc_idx] >= max_per_doc:
-                continue
+            if len(selected) >= top_k or pool_size >= len(fused_scores):
+                selected = np.asarray(selected, dtype=np.int64)
+                return pool_ids[selected], fused_scores[pool[selected]]
+            pool_size = min(len(fused_scores), pool_size * 4)
 
-            chunk = self.chunks[idx].copy()
-            chunk['relevance_score'] = score
-            selected.append(chunk)
-            doc_counts[doc_idx] += 1
+    def _mmr_select(self, index: SearchIndex, pool_ids: np.ndarray, relevance: np.ndarray,
+                    top_k: int, max_per_doc: int) -> List[int]:
+        """
+        Maximal Marginal Relevance over a candidate pool, with the per-document cap
 
-            if len(selected) >= top_k:
-                break
+        Each step takes the candidate maximizing
+        MMR_LAMBDA * relevance - (1 - MMR_LAMBDA) * (max cosine similarity to the chunks
+        already taken), so near-duplicates of a selected chunk (e.g. the same passage
+        quoted across the greenpaper series) fall behind new material. Each step is
+        one (pool, dim) x (dim,) product against the chunk just taken, so memory and
+        work stay linear in the pool, which can grow to every chunk of a filter.
 
+        Returns:
+            Positions in pool_ids, in selection order
+        """
+        order = np.argsort(pool_ids)  # Gather mmapped rows in file order
+        vectors = np.empty((len(pool_ids), index.embeddings.shape[1]), dtype=np.float32)
+        vectors[order] = index.embeddings[pool_ids[order]]
+        doc_ids = np.asarray(index.chunks.doc_idx[pool_ids])
+
+        gain = self.mmr_lambda * relevance.astype(np.float32)
+        redundancy = np.zeros(len(pool_ids), dtype=np.float32)
+        available = np.ones(len(pool_ids), dtype=bool)
+        doc_counts = defaultdict(int)
+        selected = []
+        while len(selected) < top_k and available.any():
+            mmr = gain - (1 - self.mmr_lambda) * redundancy
+            pick = int(np.argmax(np.where(available, mmr, -np.inf)))
+            selected.append(pick)
+            available[pick] = False
+            redundancy = np.maximum(redundancy, vectors @ vectors[pick])
+            doc_counts[doc_ids[pick]] += 1
+            if doc_counts[doc_ids[pick]] >= max_per_doc:
+                available[doc_ids == doc_ids[pick]] = False
         return selected
     
-    def compress_context(self, chunks: List[Dict], query: str) -> str:
-        """Compress chunks using OpenAI to summarize for more context (expensive!)"""
-        compressed_parts = []
-        print(f"[Compression] Compressing {len(chunks)} chunks (this will cost ~${len(chunks) * 0.007:.3f})...")
+    def compress_context(self, chunks: List[Dict], query: str, index: SearchIndex = None) -> str:
+        """
+        Compress chunks using OpenAI to summarize for more context (expensive!)
 
+        Precomputed summaries from the index are used as-is. Other chunks are looked
+        up in the summary cache under (chunk hash, query intent), and only the misses
+        are summarized, up to COMPRESSION_CONCURRENCY requests at a time.
+        """
+        index = index or self.index
+        intent = SummaryCache.intent_key(query)
+        summaries = [None] * len(chunks)
+        keys = {}
         for i, chunk in enumerate(chunks):
-            prompt = f"Summarize this text concisely, focusing on aspects relevant to: '{query}'\n\nText: {chunk['text'][:2000]}"
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.chat_model,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.3,
-                    max_tokens=150
-                )
-                summary = response.choices[0].message.content
+            row = chunk['chunk_id']
+            if index.chunk_summaries is not None and index.chunk_summaries[row]:
+                summaries[i] = index.chunk_summaries[row]
+                continue
+            keys[i] = SummaryCache.key(self.chat_model, index.chunk_hashes[row].tobytes(), intent)
+            summaries[i] = self.summary_cache.get(keys[i])
 
-                # Track cost
-                input_tokens = len(self.tokenizer.encode(prompt))
-                output_tokens = len(self.tokenizer.encode(summary))
-                self.track_cost(input_tokens, output_tokens, self.chat_model)
+        pending = [i for i, summary in enumerate(summaries) if summary is None]
+        print(f"[Compression] {len(chunks) - len(pending)}/{len(chunks)} summaries reused, compressing "
+              f"{len(pending)} chunks (this will cost ~${len(pending) * 0.007:.3f})...")
 
-                compressed_parts.append(summary)
-                if (i + 1) % 10 == 0:
-                    print(f"[Compression] Processed {i + 1}/{len(chunks)} chunks...")
+        def summarize(i):
+            try:
+                summary = self._summarize_text(chunks[i]['text'], query)
             except Exception as e:
                 print(f"[Warning] Compression failed for chunk {i}: {e}")
-                summary = chunk['text'][:500]  # Fallback
-                compressed_parts.append(summary)
+                return chunks[i]['text'][:500]  # Fallback, not cached
+            self.summary_cache.put(keys[i], summary)
+            return summary
 
-        return "\n\n".join(compressed_parts)
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.compression_concurrency, len(pending)))) as executor:
+                for i, summary in zip(pending, executor.map(summarize, pending)):
+                    summaries[i] = summary
+
+        return "\n\n".join(summaries)
+
+    def _summarize_text(self, text: str, query: str = None) -> str:
+        """One chat completion summarizing text, focused on the query when one is given"""
+        if query is None:
+            prompt = f"Summarize this text concisely, keeping the key technical facts, names and figures\n\nText: {text[:2000]}"
+        else:
+            prompt = f"Summarize this text concisely, focusing on aspects relevant to: '{query}'\n\nText: {text[:2000]}"
+        response = self.client.chat.completions.create(
+            model=self.chat_model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=150
+        )
+        self.track_usage(response.usage, self.chat_model)
+        return response.choices[0].message.content
     
-    def build_context(self, chunks: List[Dict], query: str) -> str:
-        """Build context from chunks with optional compression"""
-        # Group chunks by doc_idx to reconstruct
-        doc_groups = defaultdict(list)
-        for chunk in chunks:
-            doc_groups[chunk['doc_idx']].append(chunk)
+    def pack_context(self, chunks: List[Dict], token_budget: int, index: SearchIndex = None):
+        """
+        Pack chunks into a context string of at most token_budget tokens
 
-        context_parts = []
-        for doc_idx, group in doc_groups.items():
-            metadata = group[0]['metadata']
-            combined_text = " ".join(c['text'] for c in group)  # Recombine for coherence
-            context_parts.append(f"Document: {metadata.get('filename', 'Unknown')}")
-            context_parts.append(f"Title: {metadata.get('title', 'Unknown')}")
-            context_parts.append(f"Type: {metadata.get('doc_type', 'research')}")
-            context_parts.append(f"Content: {combined_text[:2000]}...")  # Initial truncate
-            context_parts.append("")
+        Chunks are taken in relevance order. A chunk whose section has at most
+        SECTION_CONTEXT_MAX_TOKENS tokens brings in that whole section when it fits,
+        so the model reads coherent sections rather than window fragments; otherwise
+        only the chunk is added. Each one costs only the tokens it adds to its
+        document's selected spans, so text shared with an already selected chunk or
+        section is counted and emitted once; chunks that no longer fit are skipped.
+        Spans of a document are merged by token offset and sliced out of the
+        document text, and all token counts come from the index, not the tokenizer.
 
-        full_context = "\n".join(context_parts)
-        context_tokens = len(self.tokenizer.encode(full_context))
+        Returns:
+            (context, n_tokens)
+        """
+        index = index or self.index
+        doc_spans = {}  # doc_idx -> [(token_start, token_end, byte_start, byte_end)], in relevance order of docs
+        used = 0
+        for chunk in chunks:
+            row = chunk['chunk_id']
+            spans = doc_spans.get(chunk['doc_idx'], [])
+            chunk_span = (*(int(x) for x in index.chunks.token_ranges[row]),
+                          *(int(x) for x in index.chunks.byte_ranges[row]))
+            section = index.chunks.chunk_section[row]
+            section_span = (*(int(x) for x in index.chunks.section_token_ranges[section]),
+                            *(int(x) for x in index.chunks.section_byte_ranges[section]))
+            options = [chunk_span]
+            if section_span != chunk_span and section_span[1] - section_span[0] <= self.section_context_max_tokens:
+                options.insert(0, section_span)
+            for span in options:
+                candidate = self._merge_spans(spans + [span])
+                cost = (self._doc_context_tokens(index, chunk['doc_idx'], candidate) -
+                        self._doc_context_tokens(index, chunk['doc_idx'], spans))
+                if used + cost <= token_budget:
+                    doc_spans[chunk['doc_idx']] = candidate
+                    used += cost
+                    break
+
+        blocks = []
+        for doc_idx, spans in doc_spans.items():
+            # A span starting at token 0 already begins with the document's header lines
+            header = "" if spans[0][0] == 0 else self._context_header(index.documents[doc_idx])
+            texts = [index.chunks.span_text(byte_start, byte_end) for _, _, byte_start, byte_end in spans]
+            blocks.append(header + CONTEXT_SPAN_SEPARATOR.join(texts))
+        return CONTEXT_DOC_SEPARATOR.join(blocks), used
+
+    @staticmethod
+    def _merge_spans(spans: List[tuple]) -> List[tuple]:
+        """Sort spans by token offset and merge the ones that overlap or touch"""
+        merged = []
+        for span in sorted(spans):
+            if merged and span[0] <= merged[-1][1]:
+                last = merged[-1]
+                merged[-1] = (last[0], max(last[1], span[1]), last[2], max(last[3], span[3]))
+            else:
+                merged.append(span)
+        return merged
+
+    def _doc_context_tokens(self, index: SearchIndex, doc_idx: int, spans: List[tuple]) -> int:
+        """Tokens one document contributes to the context for a set of merged spans"""
+        if not spans:
+            return 0
+        tokens = sum(end - start for start, end, _, _ in spans)
+        tokens += (len(spans) - 1) * index.span_separator_tokens + index.doc_separator_tokens
+        if spans[0][0] > 0:
+            tokens += index.documents[doc_idx]['header_tokens']
+        return tokens
+
+    def build_context(self, chunks: List[Dict], query: str, index: SearchIndex = None) -> str:
+        """
+        Build context from chunks within the token budget, with optional compression
+
+        The threshold is compared with the retrieved chunks before packing: the
+        packed context never exceeds CONTEXT_TOKEN_BUDGET, so it could not reach a
+        threshold above the budget. Compressing summarizes every retrieved chunk
+        instead of dropping the ones that do not fit.
+        """
+        retrieved_tokens = sum(chunk['token_count'] for chunk in chunks)
 
         # Compress only if enabled AND exceeds threshold
-        if self.enable_compression and context_tokens > self.compression_threshold:
-            print(f"[Context] {context_tokens} tokens exceeds threshold ({self.compression_threshold}), compressing...")
-            full_context = self.compress_context(chunks, query)
+        if self.enable_compression and retrieved_tokens > self.compression_threshold:
+            print(f"[Context] {retrieved_tokens} retrieved tokens exceed threshold ({self.compression_threshold}), compressing...")
+            return self.compress_context(chunks, query, index)
+
+        full_context, context_tokens = self.pack_context(chunks, self.context_token_budget, index)
+        if retrieved_tokens > self.compression_threshold:
+            print(f"[Context] {retrieved_tokens} retrieved tokens exceed threshold, but compression is disabled; "
+                  f"packed {context_tokens}")
         else:
-            if context_tokens > self.compression_threshold:
-                print(f"[Context] {context_tokens} tokens exceeds threshold, but compression is disabled")
-            else:
-                print(f"[Context] Using {context_tokens} tokens (under threshold: {self.compression_threshold})")
+            print(f"[Context] Using {context_tokens} tokens (under threshold: {self.compression_threshold})")
 
         return full_context
     
-    def answer_question(self, question: str, context_docs: int = None, return_sources: bool = False):
+    def answer_question(self, question: str, context_docs: int = None, return_sources: bool = False,
+                        doc_types: List[str] = None, filenames: List[str] = None):
         """
         Answer a question about Zenon Network design research
 
@@ -500,25 +2932,339 @@ class ZenonQA:
             question: The question to answer
             context_docs: Number of context documents to use
             return_sources: If True, return dict with answer and sources. If False, return just answer string.
+            doc_types: Only retrieve from documents of these types (e.g. 'greenpaper')
+            filenames: Only retrieve from these documents
 
         Returns:
             If return_sources=False: str (answer text)
-            If return_sources=True: dict with keys 'answer' (str) and 'sources' (list of dicts)
+            If return_sources=True: dict with keys 'answer' (str), 'sources' (list of dicts)
+                and 'cache_hit' (bool, True when served from the semantic answer cache)
         """
         if context_docs is None:
             context_docs = self.default_context_docs
+        index = self.index  # Kept for the whole request, even if a reload swaps self.index
+        doc_filter = _doc_filter(doc_types, filenames)
+
+        try:
+            query_embedding, relevant_chunks, index = self._retrieve(
+                question, self._answer_top_k(context_docs), index, doc_filter=doc_filter)
+        except Exception as e:
+            print(f"Error retrieving context: {e}")
+            return self._format_answer(NO_CONTEXT_ANSWER, [], return_sources)
+
+        cached = self.answer_cache.lookup(query_embedding, index.corpus_version, context_docs, doc_filter)
+        if cached:
+            return self._format_answer(cached['answer'], cached['sources'], return_sources, cache_hit=True)
 
         # Find relevant chunks (larger top_k for hybrid)
-        relevant_chunks = self.find_relevant_chunks(question, top_k=context_docs * 2)  # Oversample
+        if relevant_chunks is None:
+            relevant_chunks = self.rank_chunks(question, query_embedding, self._answer_top_k(context_docs), index=index,
+                                               doc_filter=doc_filter)  # Oversample
 
         if not relevant_chunks:
-            answer = "I couldn't find any relevant documentation to answer your question."
-            if return_sources:
-                return {"answer": answer, "sources": []}
-            return answer
+            return self._format_answer(NO_CONTEXT_ANSWER, [], return_sources)
+
+        messages = self._build_messages(question, relevant_chunks, index)
+
+        try:
+            response = self.client.chat.completions.create(
+                model=self.chat_model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000  # Increased for more detailed answers
+            )
+            answer = response.choices[0].message.content
+            self.track_usage(response.usage, self.chat_model)
+        except Exception as e:
+            return self._format_answer(f"Error generating answer: {e}", [], return_sources)
+
+        sources = self._extract_sources_from_chunks(relevant_chunks)
+        self.answer_cache.put(query_embedding, index.corpus_version, context_docs, answer, sources, doc_filter)
+        return self._format_answer(answer, sources, return_sources)
+
+    async def answer_question_async(self, question: str, context_docs: int = None, return_sources: bool = False,
+                                    doc_types: List[str] = None, filenames: List[str] = None):
+        """
+        Async variant of answer_question for use inside an event loop
+
+        OpenAI calls are awaited through AsyncOpenAI, and CPU-bound work (scoring,
+        context building) runs in the default executor, so one slow completion
+        does not stall other requests served by the same worker.
+        """
+        if context_docs is None:
+            context_docs = self.default_context_docs
+        index = self.index  # Kept for the whole request, even if a reload swaps self.index
+        doc_filter = _doc_filter(doc_types, filenames)
+
+        try:
+            query_embedding, relevant_chunks, index = await self._retrieve_async(
+                question, self._answer_top_k(context_docs), index, doc_filter=doc_filter)
+        except Exception as e:
+            print(f"Error retrieving context: {e}")
+            return self._format_answer(NO_CONTEXT_ANSWER, [], return_sources)
+
+        result = await self._answer_from_chunks_async(question, query_embedding, relevant_chunks, index,
+                                                      context_docs, doc_filter)
+        return result if return_sources else result['answer']
 
+    async def _answer_from_chunks_async(self, question: str, query_embedding: np.ndarray, relevant_chunks,
+                                        index: SearchIndex, context_docs: int, doc_filter=None) -> Dict:
+        """
+        Rest of answer_question_async once the question is embedded
+
+        relevant_chunks may be None, in which case they are ranked here after an
+        answer cache miss. Returns the answer dict of return_sources=True.
+        """
+        loop = asyncio.get_running_loop()
+        # The cache's matvec and sort run under its lock, so keep them off the event loop
+        cached = await loop.run_in_executor(
+            None, self.answer_cache.lookup, query_embedding, index.corpus_version, context_docs, doc_filter)
+        if cached:
+            return self._format_answer(cached['answer'], cached['sources'], True, cache_hit=True)
+
+        if relevant_chunks is None:
+            relevant_chunks = await loop.run_in_executor(
+                None, lambda: self.rank_chunks(question, query_embedding, self._answer_top_k(context_docs), index=index,
+                                               doc_filter=doc_filter))  # Oversample
+
+        if not relevant_chunks:
+            return self._format_answer(NO_CONTEXT_ANSWER, [], True)
+
+        messages = await loop.run_in_executor(None, self._build_messages, question, relevant_chunks, index)
+
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.chat_model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000  # Increased for more detailed answers
+            )
+            answer = response.choices[0].message.content
+            self.track_usage(response.usage, self.chat_model)
+        except Exception as e:
+            return self._format_answer(f"Error generating answer: {e}", [], True)
+
+        sources = self._extract_sources_from_chunks(relevant_chunks)
+        await loop.run_in_executor(None, self.answer_cache.put, query_embedding, index.corpus_version,
+                                   context_docs, answer, sources, doc_filter)
+        return self._format_answer(answer, sources, True)
+
+    async def answer_questions_async(self, questions: List[str], context_docs: int = None,
+                                     concurrency: int = 8):
+        """
+        Answer many questions concurrently, yielding each result as it completes
+
+        All questions are embedded in one call (cache misses only, via
+        embed_queries) and ranked together as a query matrix; then up to
+        `concurrency` chat completions run at a time. With a retrieval service
+        (or if the batch embedding call fails), questions are retrieved one by one
+        as they take a slot; the retrieval service batches them instead.
+
+        Yields:
+            Answer dicts (as answer_question with return_sources=True) plus 'index'
+            (position in questions), 'question' and 'latency_ms' (time from taking
+            a completion slot until the answer was ready, plus the shared embedding
+            and ranking time when the batch was retrieved together)
+        """
+        if context_docs is None:
+            context_docs = self.default_context_docs
+        index = self.index  # Kept for the whole batch, even if a reload swaps self.index
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(concurrency)
+
+        ranked = None
+        shared_ms = 0.0  # Batch embedding and ranking, which every answer waited for
+        if self.retrieval is None:
+            shared_started = time.perf_counter()
+            try:
+                query_embeddings = await loop.run_in_executor(None, self.embed_queries, questions)
+                ranked = await loop.run_in_executor(
+                    None, lambda: self.rank_chunk_ids(questions, query_embeddings, self._answer_top_k(context_docs), index=index))
+                shared_ms = (time.perf_counter() - shared_started) * 1000
+            except Exception as e:
+                print(f"Error creating query embeddings, embedding questions one by one: {e}")
+                ranked = None
+
+        async def answer(i: int) -> Dict:
+            async with slots:
+                started = time.perf_counter()
+                question = questions[i]
+                try:
+                    if ranked is None:
+                        query_embedding, relevant_chunks, item_index = await self._retrieve_async(
+                            question, self._answer_top_k(context_docs), index)
+                    else:
+                        query_embedding, item_index = query_embeddings[i], index
+                        relevant_chunks = self._chunks_by_id(index, *ranked[i])
+                except Exception as e:
+                    print(f"Error retrieving context: {e}")
+                    result = self._format_answer(NO_CONTEXT_ANSWER, [], True)
+                else:
+                    result = await self._answer_from_chunks_async(
+                        question, query_embedding, relevant_chunks, item_index, context_docs)
+            result.update(index=i, question=question, latency_ms=round((time.perf_counter() - started) * 1000 + shared_ms, 1))
+            return result
+
+        for task in asyncio.as_completed([answer(i) for i in range(len(questions))]):
+            yield await task
+
+    @staticmethod
+    def latency_stats(latencies_ms: List[float], wall_ms: float) -> Dict:
+        """Aggregate latency of a batch: per-item distribution plus wall-clock throughput"""
+        latencies = np.sort(np.asarray(latencies_ms, dtype=np.float64))
+        if not len(latencies):
+            return {'count': 0, 'wall_ms': round(wall_ms, 1)}
+        return {
+            'count': len(latencies),
+            'wall_ms': round(wall_ms, 1),
+            'mean_ms': round(float(latencies.mean()), 1),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+            'max_ms': round(float(latencies[-1]), 1),
+            'questions_per_second': round(len(latencies) / (wall_ms / 1000), 2) if wall_ms > 0 else None,
+        }
+
+    def answer_question_stream(self, question: str, context_docs: int = None,
+                               doc_types: List[str] = None, filenames: List[str] = None):
+        """
+        Answer a question, yielding events as the model produces tokens
+
+        Yields dicts with a 'type' key: 'sources' (sent first, with the source
+        list), then one 'token' per content delta, then 'done' (with 'cache_hit').
+        On failure an 'error' event is yielded instead of the remaining tokens.
+        """
+        if context_docs is None:
+            context_docs = self.default_context_docs
+        index = self.index  # Kept for the whole request, even if a reload swaps self.index
+        doc_filter = _doc_filter(doc_types, filenames)
+
+        try:
+            query_embedding, relevant_chunks, index = self._retrieve(
+                question, self._answer_top_k(context_docs), index, doc_filter=doc_filter)
+        except Exception as e:
+            print(f"Error retrieving context: {e}")
+            query_embedding = None
+
+        cached = query_embedding is not None and self.answer_cache.lookup(
+            query_embedding, index.corpus_version, context_docs, doc_filter)
+        if cached:
+            yield from self._cached_answer_events(cached)
+            return
+
+        if query_embedding is None:
+            relevant_chunks = []
+        elif relevant_chunks is None:
+            relevant_chunks = self.rank_chunks(question, query_embedding, self._answer_top_k(context_docs), index=index,
+                                               doc_filter=doc_filter)  # Oversample
+        sources = self._extract_sources_from_chunks(relevant_chunks)
+        yield {"type": "sources", "sources": sources}
+
+        if not relevant_chunks:
+            yield {"type": "token", "content": NO_CONTEXT_ANSWER}
+            yield {"type": "done", "cache_hit": False}
+            return
+
+        messages = self._build_messages(question, relevant_chunks, index)
+        parts = []
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.chat_model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000,
+                stream=True,
+                stream_options={"include_usage": True}  # Usage arrives on a final chunk without choices
+            )
+            for chunk in stream:
+                if getattr(chunk, 'usage', None):
+                    self.track_usage(chunk.usage, self.chat_model)
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if content:
+                    parts.append(content)
+                    yield {"type": "token", "content": content}
+        except Exception as e:
+            yield {"type": "error", "message": f"Error generating answer: {e}"}
+            return
+
+        answer = "".join(parts)
+        self.answer_cache.put(query_embedding, index.corpus_version, context_docs, answer, sources, doc_filter)
+        yield {"type": "done", "cache_hit": False}
+
+    async def answer_question_stream_async(self, question: str, context_docs: int = None,
+                                           doc_types: List[str] = None, filenames: List[str] = None):
+        """Async variant of answer_question_stream (same event sequence)"""
+        if context_docs is None:
+            context_docs = self.default_context_docs
+        index = self.index  # Kept for the whole request, even if a reload swaps self.index
+        doc_filter = _doc_filter(doc_types, filenames)
+        loop = asyncio.get_running_loop()
+
+        try:
+            query_embedding, relevant_chunks, index = await self._retrieve_async(
+                question, self._answer_top_k(context_docs), index, doc_filter=doc_filter)
+        except Exception as e:
+            print(f"Error retrieving context: {e}")
+            query_embedding = None
+
+        cached = query_embedding is not None and await loop.run_in_executor(
+            None, self.answer_cache.lookup, query_embedding, index.corpus_version, context_docs, doc_filter)
+        if cached:
+            for event in self._cached_answer_events(cached):
+                yield event
+            return
+
+        if query_embedding is None:
+            relevant_chunks = []
+        elif relevant_chunks is None:
+            relevant_chunks = await loop.run_in_executor(
+                None, lambda: self.rank_chunks(question, query_embedding, self._answer_top_k(context_docs), index=index,
+                                               doc_filter=doc_filter))  # Oversample
+        sources = self._extract_sources_from_chunks(relevant_chunks)
+        yield {"type": "sources", "sources": sources}
+
+        if not relevant_chunks:
+            yield {"type": "token", "content": NO_CONTEXT_ANSWER}
+            yield {"type": "done", "cache_hit": False}
+            return
+
+        messages = await loop.run_in_executor(None, self._build_messages, question, relevant_chunks, index)
+        parts = []
+        try:
+            stream = await self.async_client.chat.completions.create(
+                model=self.chat_model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1000,
+                stream=True,
+                stream_options={"include_usage": True}  # Usage arrives on a final chunk without choices
+            )
+            async for chunk in stream:
+                if getattr(chunk, 'usage', None):
+                    self.track_usage(chunk.usage, self.chat_model)
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if content:
+                    parts.append(content)
+                    yield {"type": "token", "content": content}
+        except Exception as e:
+            yield {"type": "error", "message": f"Error generating answer: {e}"}
+            return
+
+        answer = "".join(parts)
+        await loop.run_in_executor(None, self.answer_cache.put, query_embedding, index.corpus_version,
+                                   context_docs, answer, sources, doc_filter)
+        yield {"type": "done", "cache_hit": False}
+
+    @staticmethod
+    def _cached_answer_events(cached: Dict):
+        yield {"type": "sources", "sources": cached['sources']}
+        yield {"type": "token", "content": cached['answer']}
+        yield {"type": "done", "cache_hit": True}
+
+    def _build_messages(self, question: str, relevant_chunks: List[Dict],
+                        index: SearchIndex = None) -> List[Dict]:
+        """Build the system and user messages for a question and its retrieved chunks"""
         # Build compressed context
-        context = self.build_context(relevant_chunks, question)
+        context = self.build_context(relevant_chunks, question, index)
 
         # Calculate average relevance score to determine if we're speculating
         avg_relevance = sum(chunk.get('relevance_score', 0) for chunk in relevant_chunks) / len(relevant_chunks)
@@ -574,35 +3320,17 @@ Question: {question}
 
 Please provide a clear, technically accurate answer."""
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.chat_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1000  # Increased for more detailed answers
-            )
-
-            # Track cost
-            input_tokens = len(self.tokenizer.encode(system_prompt + user_prompt))
-            output_tokens = len(self.tokenizer.encode(response.choices[0].message.content))
-            self.track_cost(input_tokens, output_tokens, self.chat_model)
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
 
-            answer = response.choices[0].message.content
-
-            # If sources are requested, extract and format them
-            if return_sources:
-                sources = self._extract_sources_from_chunks(relevant_chunks)
-                return {"answer": answer, "sources": sources}
-
-            return answer
-        except Exception as e:
-            error_msg = f"Error generating answer: {e}"
-            if return_sources:
-                return {"answer": error_msg, "sources": []}
-            return error_msg
+    @staticmethod
+    def _format_answer(answer: str, sources: List[Dict], return_sources: bool, cache_hit: bool = False):
+        """Shape an answer as a plain string or an answer/sources dict"""
+        if return_sources:
+            return {"answer": answer, "sources": sources, "cache_hit": cache_hit}
+        return answer
 
     def _extract_sources_from_chunks(self, chunks: List[Dict]) -> List[Dict]:
         """
@@ -633,6 +3361,42 @@ Please provide a clear, technically accurate answer."""
 
         return sources
     
+    def answer_batch_file(self, path: str, concurrency: int = 8, output=None) -> Dict:
+        """
+        Answer a JSONL file of questions, writing one JSON result per line as each completes
+
+        Each input line is {"question": ...} (an "id" field is copied to the result)
+        or a bare JSON string. Progress messages and the aggregate latency summary
+        go to stderr, so output stays valid JSONL.
+        """
+        output = output or sys.stdout
+        if path == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        items = [json.loads(line) for line in lines if line.strip()]
+        questions = [item['question'] if isinstance(item, dict) else str(item) for item in items]
+
+        async def run():
+            latencies = []
+            started = time.perf_counter()
+            async for result in self.answer_questions_async(questions, concurrency=concurrency):
+                item = items[result['index']]
+                if isinstance(item, dict) and 'id' in item:
+                    result['id'] = item['id']
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                output.flush()
+                latencies.append(result['latency_ms'])
+            return self.latency_stats(latencies, (time.perf_counter() - started) * 1000)
+
+        with contextlib.redirect_stdout(sys.stderr):
+            stats = asyncio.run(run())
+            print(f"Answered {stats['count']} questions: {json.dumps(stats)}")
+            if self.enable_cost_tracking:
+                print(f"Total cost: ${self.total_cost:.4f}")
+        return stats
+
     def interactive_chat(self):
         """Run an interactive chat session"""
         print("\n" + "="*60)
@@ -644,7 +3408,7 @@ Please provide a clear, technically accurate answer."""
         print(f"  - Chat Model: {self.chat_model}")
         print(f"  - Default Context Docs: {self.default_context_docs}")
         print(f"  - Compression: {'Enabled' if self.enable_compression else 'Disabled'} (threshold: {self.compression_threshold:,} tokens)")
-        print(f"  - Diversity Re-ranking: {'Enabled' if self.enable_diversity else 'Disabled'}")
+        print(f"  - Diversity Re-ranking: {f'Enabled (MMR lambda: {self.mmr_lambda})' if self.enable_diversity else 'Disabled'}")
         print(f"  - Cost Tracking: {'Enabled' if self.enable_cost_tracking else 'Disabled'}")
         print("\nYou can ask questions about Zenon Network design. Type 'quit' to exit.")
         print("Type 'stats' to see statistics about the documentation.")
@@ -666,12 +3430,17 @@ Please provide a clear, technically accurate answer."""
                 continue
 
             print("\n🔍 Searching for relevant documentation (hybrid mode)...")
-            answer = self.answer_question(question)
-
-            print("\n💡 Answer:")
-            print("-" * 40)
-            print(answer)
-            print("-" * 40)
+            answer_started = False
+            for event in self.answer_question_stream(question):
+                if event['type'] in ('token', 'error') and not answer_started:
+                    print("\n💡 Answer:")
+                    print("-" * 40)
+                    answer_started = True
+                if event['type'] == 'token':
+                    print(event['content'], end='', flush=True)
+                elif event['type'] == 'error':
+                    print(event['message'])
+            print("\n" + "-" * 40)
 
     def show_statistics(self):
         """Show statistics about the loaded documents"""
@@ -705,6 +3474,28 @@ Please provide a clear, technically accurate answer."""
         print("-" * 40)
 
 
+def serve_retrieval(context_dir: str, api_key: str):
+    """Run the retrieval service for the index prebuilt by build-index"""
+    socket_path = os.getenv('RETRIEVAL_SOCKET')
+    if not socket_path:
+        print("Error: RETRIEVAL_SOCKET is not set")
+        sys.exit(1)
+
+    qa_tool = ZenonQA(context_dir, api_key, read_only=True)
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        # Keep query embeddings across service restarts; optional like in web_app
+        try:
+            from redis import Redis
+            qa_tool.query_cache.redis = Redis.from_url(redis_url, decode_responses=True, socket_connect_timeout=5)
+            qa_tool.query_cache.redis.ping()
+        except Exception as e:
+            print(f"Warning: Redis not available for the query cache: {e}")
+            qa_tool.query_cache.redis = None
+
+    RetrievalServer(qa_tool, socket_path).serve_forever()
+
+
 def main():
     # Check for API key
     api_key = os.getenv('OPENAI_API_KEY')
@@ -716,23 +3507,54 @@ def main():
         print("  OPENAI_API_KEY=your-api-key-here")
         sys.exit(1)
 
-    # Check for context directory argument or use default
-    if len(sys.argv) > 1:
-        context_dir = sys.argv[1]
-    else:
-        context_dir = 'context'
+    # 'build-index' only builds or updates the index in cache/index/ and exits;
+    # 'serve-retrieval' serves that index to thin web workers over RETRIEVAL_SOCKET
+    argv = sys.argv[1:]
+    command = argv[0] if argv and argv[0] in ('build-index', 'serve-retrieval') else None
+    parser = argparse.ArgumentParser(
+        prog='zenon_ai.py',
+        usage="python zenon_ai.py [build-index | serve-retrieval] [--batch FILE] [context_directory]",
+        description="Zenon AI - Research Documentation Q&A Tool. With build-index, build the "
+                    "search index for web workers (INDEX_READ_ONLY=true) and exit. With "
+                    "serve-retrieval, answer retrieval queries from web workers started with "
+                    "RETRIEVAL_SOCKET.")
+    parser.add_argument('context_dir', nargs='?', default=os.getenv('CONTEXT_DIR', 'context'),
+                        help="directory of Markdown documentation (default: context)")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="answer the questions in a JSONL file ({\"question\": ...} per line, "
+                             "or - for stdin) and write JSONL results to stdout")
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('BATCH_CONCURRENCY', '8')),
+                        help="chat completions running at once in --batch mode (default: 8)")
+    args = parser.parse_args(argv[1:] if command else argv)
+    context_dir = args.context_dir
+
+    if command == 'serve-retrieval':
+        serve_retrieval(context_dir, api_key)
+        return
 
     # Check if directory exists
     if not os.path.exists(context_dir):
         print(f"Error: Context directory '{context_dir}' not found!")
-        print("\nUsage: python zenon_ai.py [context_directory]")
+        print("\nUsage: python zenon_ai.py [build-index | serve-retrieval] [context_directory]")
         print("Example: python zenon_ai.py context")
         print("\nMake sure your Markdown documentation files are in the 'context/' directory.")
         sys.exit(1)
 
     try:
-        # Create Q&A tool
-        qa_tool = ZenonQA(context_dir, api_key)
+        # Create Q&A tool (in --batch mode stdout is kept for the JSONL results)
+        with contextlib.redirect_stdout(sys.stderr) if args.batch else contextlib.nullcontext():
+            qa_tool = ZenonQA(context_dir, api_key)
+
+        if command == 'build-index':
+            manifest = qa_tool._read_manifest()
+            size = sum(manifest['files'].values())
+            print(f"Index {manifest['corpus_version']} (format {manifest['format_version']}) is up to date: "
+                  f"{manifest['n_chunks']} chunks, {size / 1e6:.1f} MB in {qa_tool.index_dir}")
+            return
+
+        if args.batch:
+            qa_tool.answer_batch_file(args.batch, args.concurrency)
+            return
 
         # Start interactive chat
         qa_tool.interactive_chat()